@@ -0,0 +1,38 @@
+# benchmarks/common.py
+"""基准脚本公用：初始化 Django、生成模拟特征数据"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 一条真实样本（与 predictor/tests.py 一致），模拟数据在其附近加噪声
+SAMPLE_ROW = {
+    "工步序号": 1, "电压": 3.2197, "电阻": 0.382, "负短电压": 2, "K值": 0, "来料分容标识": 2,
+    "来料化成容量": 0, "来料电芯K值": 0.75562, "来料内阻4": 0.411, "来料V2壳压": 2.27123, "来料V3壳压": 2.3065,
+    "来料电芯厚度": 40.197, "来料V2电压": 3.24784, "来料V3电压": 3.2424, "来料电芯电压5": 3.2197,
+    "来料电芯重量": 1111.7, "来料电容数据": 55891, "来料二注保液量": 204.65, "来料Dcir": 1.652,
+    "来料V2内阻": 0.399, "累计时间_秒": 1,
+}
+
+
+def setup_django():
+    sys.path.insert(0, BASE_DIR)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "xz1.settings")
+    import django
+    django.setup()
+
+
+def sample_frame(feature_cols, rows, seed=42):
+    """按 SAMPLE_ROW 加 1% 噪声生成 rows 行数据，列顺序与 feature_cols 一致"""
+    rng = np.random.default_rng(seed)
+    base = np.array([float(SAMPLE_ROW.get(c, 0.0)) for c in feature_cols])
+    noise = rng.normal(scale=0.01, size=(rows, len(feature_cols))) * np.where(base == 0, 1.0, np.abs(base))
+    return pd.DataFrame(base + noise, columns=feature_cols)
+
+
+def percentiles(samples, qs=(50, 90, 99)):
+    arr = np.asarray(samples) * 1e3
+    return {f"p{q}_ms": float(np.percentile(arr, q)) for q in qs}
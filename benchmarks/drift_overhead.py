@@ -0,0 +1,46 @@
+# benchmarks/drift_overhead.py
+"""
+漂移监控开销：对比每行推理耗时与每行漂移统计更新耗时。
+    python benchmarks/drift_overhead.py --batches 1,100,5000
+"""
+import argparse
+import json
+import time
+
+from common import sample_frame, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batches', default='1,100,5000', help='批大小列表，逗号分隔')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+    from predictor.drift import DriftMonitor
+    from predictor.utils import get_model_service
+
+    svc = get_model_service()
+    monitor = DriftMonitor(svc)
+    results = {"reference": monitor.reference}
+    for size in [int(b) for b in args.batches.split(',')]:
+        df = sample_frame(svc.feature_cols, size)
+        preds = svc.predict(df)
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            svc.predict(df)
+        t_predict = (time.perf_counter() - t0) / (args.repeat * size)
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            monitor.observe_frame(df, preds)
+        t_drift = (time.perf_counter() - t0) / (args.repeat * size)
+        results[f"batch_{size}"] = {
+            "predict_us_per_row": t_predict * 1e6,
+            "drift_us_per_row": t_drift * 1e6,
+            "overhead_pct": 100 * t_drift / t_predict,
+        }
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
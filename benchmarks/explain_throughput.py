@@ -0,0 +1,53 @@
+# benchmarks/explain_throughput.py
+"""
+SHAP 解释吞吐：不同批大小下每秒可解释的行数（冷缓存 / 热缓存），以及与纯预测的对比。
+    python benchmarks/explain_throughput.py --batches 1,100,5000
+"""
+import argparse
+import json
+import time
+
+from common import sample_frame, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batches', default='1,100,5000', help='批大小列表，逗号分隔')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from predictor.result_cache import ResultCache
+    from predictor.utils import get_model_service
+
+    svc = get_model_service()
+    results = {}
+    for size in [int(b) for b in args.batches.split(',')]:
+        frames = [sample_frame(svc.feature_cols, size, seed=i) for i in range(args.repeat)]
+        t0 = time.perf_counter()
+        for df in frames:
+            svc.predict(df)
+        t_predict = time.perf_counter() - t0
+
+        cache = ResultCache(maxsize=size * args.repeat)
+        t0 = time.perf_counter()
+        for df in frames:
+            svc.explain(df, cache=cache)
+        t_cold = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for df in frames:
+            svc.explain(df, cache=cache)
+        t_warm = time.perf_counter() - t0
+
+        rows = size * args.repeat
+        results[f"batch_{size}"] = {
+            "predict_rows_per_sec": rows / t_predict,
+            "explain_rows_per_sec_cold": rows / t_cold,
+            "explain_rows_per_sec_warm": rows / t_warm,
+            "explain_vs_predict_cost": t_cold / t_predict,
+        }
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
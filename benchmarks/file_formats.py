@@ -0,0 +1,92 @@
+# benchmarks/file_formats.py
+"""
+上传文件格式基准：比较各格式的文件大小、解析耗时与峰值内存。
+    python benchmarks/file_formats.py --rows 200000
+
+- 按 models/metadata.json 的 feature_cols 生成模拟数据（外加电芯条码等若干无关列）
+- 每种格式在独立子进程中解析（predictor.bulk_io.read_frame，只读 feature 列），
+  峰值内存 = tracemalloc 峰值（Python/NumPy） + pyarrow 内存池峰值
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from predictor.bulk_io import FILE_FORMATS, detect_format, read_frame, write_frame  # noqa: E402
+
+
+def make_frame(feature_cols, rows):
+    rng = np.random.default_rng(42)
+    data = {c: rng.normal(size=rows).astype('float64') for c in feature_cols}
+    data['电芯条码'] = [f'03HPB0BT0001EYF7S{i // 50:07d}' for i in range(rows)]
+    data['时间'] = pd.date_range('2025-01-01', periods=rows, freq='s').astype(str)
+    data['电芯实际位置'] = rng.integers(0, 500, size=rows)
+    return pd.DataFrame(data)
+
+
+def _parse_worker(path, columns, repeat, queue):
+    with open(path, 'rb') as f:
+        content = f.read()
+    fmt = detect_format(content[:8])
+    pool = None
+    try:
+        import pyarrow as pa
+        pool = pa.default_memory_pool()
+    except ImportError:
+        pass
+    tracemalloc.start()
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        df = read_frame(content, fmt, columns)
+        best = min(best, time.perf_counter() - t0)
+        del df
+    _, py_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    arrow_peak = pool.max_memory() if pool is not None else 0
+    queue.put({'detected': fmt, 'parse_seconds': best, 'peak_mb': (py_peak + (arrow_peak or 0)) / 2 ** 20})
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workdir', default=os.path.join(BASE_DIR, 'benchmarks', '_data'))
+    args = parser.parse_args()
+
+    with open(os.path.join(BASE_DIR, 'models', 'metadata.json'), 'r', encoding='utf-8') as f:
+        feature_cols = json.load(f)['feature_cols']
+    os.makedirs(args.workdir, exist_ok=True)
+    df = make_frame(feature_cols, args.rows)
+
+    ctx = mp.get_context('spawn')
+    print(f"rows={args.rows}")
+    print(f"{'format':<10}{'size_mb':>10}{'parse_s':>10}{'rows/s':>12}{'peak_mb':>10}")
+    for fmt, ext in FILE_FORMATS.items():
+        path = os.path.join(args.workdir, f'bench{ext}')
+        try:
+            write_frame(df, path, fmt)
+        except ImportError as e:
+            print(f"{fmt:<10} skipped: {e}")
+            continue
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_parse_worker, args=(path, feature_cols, args.repeat, queue))
+        proc.start()
+        res = queue.get()
+        proc.join()
+        size_mb = os.path.getsize(path) / 2 ** 20
+        print(f"{fmt:<10}{size_mb:>10.1f}{res['parse_seconds']:>10.3f}"
+              f"{args.rows / res['parse_seconds']:>12.0f}{res['peak_mb']:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+# benchmarks/shadow_overhead.py
+"""
+影子评估对主请求延迟的影响：
+    python benchmarks/shadow_overhead.py --requests 2000 --batch 1
+
+对同一批请求分别测量：仅主模型推理；主模型推理 + 100% 抽样提交影子评估。
+候选模型缺省用当前模型（--candidate 指定版本）。输出两种情况下请求线程的延迟分位数。
+"""
+import argparse
+import json
+import time
+
+from common import percentiles, sample_frame, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--batch', type=int, default=1, help='每个请求的行数')
+    parser.add_argument('--candidate', default=None, help='候选模型版本，缺省用当前模型')
+    args = parser.parse_args()
+
+    setup_django()
+    from predictor.shadow import ShadowEvaluator
+    from predictor.utils import ModelService, get_model_service
+
+    svc = get_model_service()
+    frames = [sample_frame(svc.feature_cols, args.batch, seed=i) for i in range(args.requests)]
+    records = [df.to_dict(orient='records') for df in frames]
+
+    shadow = ShadowEvaluator()
+    shadow.candidate_version = args.candidate or str(svc.model_version)
+    shadow._candidate = ModelService(version=args.candidate)
+    shadow.sample_rate = 1.0
+
+    results = {}
+    for mode in ('primary_only', 'with_shadow'):
+        latencies = []
+        for df, recs in zip(frames, records):
+            t0 = time.perf_counter()
+            preds = svc.predict(df)
+            if mode == 'with_shadow':
+                shadow.maybe_submit(recs, preds)
+            latencies.append(time.perf_counter() - t0)
+        results[mode] = percentiles(latencies)
+    shadow._executor.shutdown(wait=True)
+    results['shadow'] = shadow.summary()
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+# benchmarks/uncertainty_cost.py
+"""
+不确定性估计开销：纯预测 vs 预测 + 不确定性（共用一次预处理）的吞吐对比。
+不确定性的形式随当前模型的损失函数而定（RMSE / RMSEWithUncertainty 走虚拟集成，MultiQuantile 只需一次预测）。
+    python benchmarks/uncertainty_cost.py --batches 1,100,5000 --ensembles 10
+"""
+import argparse
+import json
+import time
+
+from common import sample_frame, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batches', default='1,100,5000', help='批大小列表，逗号分隔')
+    parser.add_argument('--ensembles', type=int, default=None, help='虚拟集成个数，缺省取 UNCERTAINTY_ENSEMBLES')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from predictor.utils import get_model_service
+
+    svc = get_model_service()
+    if args.ensembles:
+        svc.uncertainty_ensembles = args.ensembles
+    results = {"loss": svc.loss, "virtual_ensembles": svc.uncertainty_ensembles}
+    for size in [int(b) for b in args.batches.split(',')]:
+        df = sample_frame(svc.feature_cols, size)
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            svc.predict(df)
+        t_predict = (time.perf_counter() - t0) / args.repeat
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            svc.predict_with_uncertainty(df)
+        t_both = (time.perf_counter() - t0) / args.repeat
+        results[f"batch_{size}"] = {
+            "predict_ms": t_predict * 1e3,
+            "predict_with_uncertainty_ms": t_both * 1e3,
+            "relative_cost": t_both / t_predict,
+        }
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
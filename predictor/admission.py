@@ -0,0 +1,165 @@
+# predictor/admission.py
+"""
+预测接口的准入控制 / 过载保护（每个 worker 进程各自一份）。
+
+- 按流量类别（single / batch / file）分别限制并发数，单条预测有独立名额，不会排在大批量请求后面
+- batch / file 另按“在途行数”计成本：超出 MAX_ROWS_IN_FLIGHT 时直接拒绝
+  （在途行数为 0 时仍放行一个超大请求，避免永远无法处理）
+- 超出预算时尽早返回 429 + Retry-After，而不是让所有请求一起变慢；
+  single 可在 ADMISSION_SINGLE_WAIT_MS 内短暂等待名额，batch / file 默认不等待
+
+配置（环境变量）：
+ADMISSION_SINGLE_MAX / ADMISSION_BATCH_MAX / ADMISSION_FILE_MAX：各类别最大并发
+MAX_ROWS_IN_FLIGHT：batch + file 的在途行数上限
+ADMISSION_SINGLE_WAIT_MS / ADMISSION_BATCH_WAIT_MS / ADMISSION_FILE_WAIT_MS：获取名额的最长等待
+ADMISSION_JSON_BYTES_PER_ROW / ADMISSION_STEP_BYTES_PER_ROW / ADMISSION_FILE_BYTES_PER_ROW：
+  按 Content-Length 估算行数的系数（JSON 记录 / 工步数组 / 上传文件），准入判断前不解析请求体
+"""
+import math
+import os
+import threading
+import time
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.views import APIView
+
+CLASSES = ('single', 'batch', 'file')
+
+
+class Overloaded(APIException):
+    """超出预算：429，DRF 会根据 wait 自动加 Retry-After 响应头"""
+    status_code = status.HTTP_429_TOO_MANY_REQUESTS
+    default_code = 'overloaded'
+
+    def __init__(self, traffic_class: str, retry_after: int):
+        self.wait = retry_after
+        super().__init__({"error": "overloaded", "class": traffic_class, "retry_after": retry_after})
+
+
+class AdmissionController:
+    def __init__(self):
+        self.limits = {
+            'single': int(os.environ.get("ADMISSION_SINGLE_MAX", 32)),
+            'batch': int(os.environ.get("ADMISSION_BATCH_MAX", 4)),
+            'file': int(os.environ.get("ADMISSION_FILE_MAX", 2)),
+        }
+        self.wait_seconds = {
+            'single': float(os.environ.get("ADMISSION_SINGLE_WAIT_MS", 100)) / 1000,
+            'batch': float(os.environ.get("ADMISSION_BATCH_WAIT_MS", 0)) / 1000,
+            'file': float(os.environ.get("ADMISSION_FILE_WAIT_MS", 0)) / 1000,
+        }
+        self.max_rows = int(os.environ.get("MAX_ROWS_IN_FLIGHT", 200000))
+        self.bytes_per_row = {
+            'json': int(os.environ.get("ADMISSION_JSON_BYTES_PER_ROW", 600)),
+            'step': int(os.environ.get("ADMISSION_STEP_BYTES_PER_ROW", 60)),
+            'file': int(os.environ.get("ADMISSION_FILE_BYTES_PER_ROW", 200)),
+        }
+        self._cond = threading.Condition()
+        self.inflight = dict.fromkeys(CLASSES, 0)
+        self.waiting = dict.fromkeys(CLASSES, 0)
+        self.admitted = dict.fromkeys(CLASSES, 0)
+        self.shed = dict.fromkeys(CLASSES, 0)
+        self.rows_in_flight = 0
+        # 各类别请求耗时的指数滑动平均（秒），用于估算 Retry-After
+        self._avg_seconds = dict.fromkeys(CLASSES, 1.0)
+
+    def _fits(self, traffic_class, rows):
+        if self.inflight[traffic_class] >= self.limits[traffic_class]:
+            return False
+        if traffic_class == 'single':
+            return True
+        return self.rows_in_flight == 0 or self.rows_in_flight + rows <= self.max_rows
+
+    def acquire(self, traffic_class: str, rows: int = 1) -> bool:
+        deadline = time.monotonic() + self.wait_seconds[traffic_class]
+        with self._cond:
+            self.waiting[traffic_class] += 1
+            try:
+                while not self._fits(traffic_class, rows):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.shed[traffic_class] += 1
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting[traffic_class] -= 1
+            self.inflight[traffic_class] += 1
+            self.admitted[traffic_class] += 1
+            if traffic_class != 'single':
+                self.rows_in_flight += rows
+            return True
+
+    def release(self, traffic_class: str, rows: int, elapsed: float):
+        with self._cond:
+            self.inflight[traffic_class] -= 1
+            if traffic_class != 'single':
+                self.rows_in_flight -= rows
+            self._avg_seconds[traffic_class] = 0.8 * self._avg_seconds[traffic_class] + 0.2 * elapsed
+            self._cond.notify_all()
+
+    def retry_after(self, traffic_class: str) -> int:
+        return max(1, math.ceil(self._avg_seconds[traffic_class]))
+
+    def summary(self):
+        with self._cond:
+            return {
+                "limits": dict(self.limits),
+                "inflight": dict(self.inflight),
+                "queue_depth": dict(self.waiting),
+                "admitted": dict(self.admitted),
+                "shed": dict(self.shed),
+                "rows_in_flight": self.rows_in_flight,
+                "max_rows_in_flight": self.max_rows,
+            }
+
+
+_admission = None
+_admission_lock = threading.Lock()
+
+
+def get_admission():
+    global _admission
+    if _admission is None:
+        with _admission_lock:
+            if _admission is None:
+                _admission = AdmissionController()
+    return _admission
+
+
+class AdmissionControlledView(APIView):
+    """
+    在 initial() 中申请名额（早于参数校验和推理），dispatch() 的 finally 中释放：
+    处理函数抛出未处理的异常时 DRF 不会调用 finalize_response()，名额也必须归还。
+    子类设置 admission_class；admission_payload（'json' / 'step' / 'file'）表示按 Content-Length
+    估算行数，为 None 时每个请求按 1 行计。也可重写 admission_cost()，但不要在其中解析请求体。
+    """
+    admission_class = 'single'
+    admission_payload = None
+
+    def admission_cost(self, request) -> int:
+        if self.admission_payload is None:
+            return 1
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        return max(1, length // get_admission().bytes_per_row[self.admission_payload])
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        controller = get_admission()
+        rows = self.admission_cost(request)
+        if not controller.acquire(self.admission_class, rows):
+            raise Overloaded(self.admission_class, controller.retry_after(self.admission_class))
+        self._admission_ticket = (rows, time.monotonic())
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            ticket = getattr(self, '_admission_ticket', None)
+            if ticket is not None:
+                self._admission_ticket = None
+                rows, started = ticket
+                get_admission().release(self.admission_class, rows, time.monotonic() - started)
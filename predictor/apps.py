@@ -9,8 +9,10 @@ class PredictorConfig(AppConfig):
     def ready(self):
     # 可选：启动时加载模型以减少首次请求延迟
         try:
-            from .utils import get_model_service
-            get_model_service()
+            from .health import get_readiness
+            # 加载主模型（配置了候选模型时一并加载，金丝雀请求不必在请求线程里加载模型），
+            # 并用代表性样本预热；失败时由就绪探针在后台重试
+            get_readiness().load_and_warm()
         except Exception:
             # 启动期间不要让异常中断整个 Django 启动；日志记录即可
             import logging
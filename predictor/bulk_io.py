@@ -0,0 +1,126 @@
+# predictor/bulk_io.py
+"""
+批量读写工具：
+- 上传文件格式识别（按文件头 magic bytes）与按列读取：CSV / gzip、zstd 压缩 CSV / Parquet / Feather
+- 离线场景按块读取 CSV / Parquet（支持目录），原子写出结果分片
+不依赖 Django，可供视图、管理命令和 train_and_save.py 复用。
+"""
+import glob
+import io
+import os
+from typing import Iterator, List, Optional
+
+import pandas as pd
+
+INPUT_EXTS = ('.csv', '.parquet', '.pq')
+
+# 支持的文件格式 -> 结果文件扩展名
+FILE_FORMATS = {
+    'csv': '.csv',
+    'csv.gz': '.csv.gz',
+    'csv.zst': '.csv.zst',
+    'parquet': '.parquet',
+    'feather': '.feather',
+}
+COLUMNAR_FORMATS = ('parquet', 'feather')
+_CSV_COMPRESSION = {'csv': None, 'csv.gz': 'gzip', 'csv.zst': 'zstd'}
+
+
+def detect_format(head: bytes) -> str:
+    """根据文件头 magic bytes 判断格式，无法识别时按 CSV 处理"""
+    if head[:4] == b'PAR1':
+        return 'parquet'
+    if head[:6] == b'ARROW1' or head[:4] == b'FEA1':
+        return 'feather'
+    if head[:2] == b'\x1f\x8b':
+        return 'csv.gz'
+    if head[:4] == b'\x28\xb5\x2f\xfd':
+        return 'csv.zst'
+    return 'csv'
+
+
+def read_frame(content: bytes, fmt: str, columns: Optional[List[str]] = None,
+               encodings=('utf-8', 'gbk')) -> pd.DataFrame:
+    """
+    把内存中的文件内容读成 DataFrame，只读 columns 指定的列（None 表示全部，文件中不存在的列忽略）。
+    列式格式（Parquet / Feather）只解码所需列；CSV 依次尝试 encodings 中的编码。
+    """
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        pf = pq.ParquetFile(io.BytesIO(content))
+        if columns is not None:
+            columns = [c for c in columns if c in set(pf.schema_arrow.names)]
+        return pf.read(columns=columns).to_pandas()
+    if fmt == 'feather':
+        import pyarrow.feather as feather
+        import pyarrow.ipc as ipc
+        if columns is not None and content[:6] == b'ARROW1':
+            names = set(ipc.open_file(io.BytesIO(content)).schema.names)
+            columns = [c for c in columns if c in names]
+            return feather.read_table(io.BytesIO(content), columns=columns).to_pandas()
+        df = feather.read_table(io.BytesIO(content)).to_pandas()
+        return df if columns is None else df[[c for c in columns if c in df.columns]]
+
+    usecols = None
+    if columns is not None:
+        wanted = set(columns)
+        usecols = lambda c: c in wanted  # noqa: E731
+    last_error = None
+    for encoding in encodings:
+        try:
+            return pd.read_csv(io.BytesIO(content), usecols=usecols, encoding=encoding,
+                               compression=_CSV_COMPRESSION[fmt])
+        except UnicodeDecodeError as e:
+            last_error = e
+    raise last_error
+
+
+def write_frame(df: pd.DataFrame, path: str, fmt: str):
+    """按 fmt 写出 DataFrame（不根据扩展名推断）"""
+    if fmt == 'parquet':
+        df.to_parquet(path, index=False)
+    elif fmt == 'feather':
+        df.reset_index(drop=True).to_feather(path)
+    else:
+        df.to_csv(path, index=False, encoding='utf-8-sig', compression=_CSV_COMPRESSION[fmt])
+
+
+def iter_input_files(inputs: List[str]) -> List[str]:
+    """展开输入：文件原样保留，目录取其中的 csv/parquet 文件（按文件名排序）"""
+    files = []
+    for p in inputs:
+        if os.path.isdir(p):
+            for ext in INPUT_EXTS:
+                files.extend(glob.glob(os.path.join(p, f'*{ext}')))
+        else:
+            files.append(p)
+    return sorted(dict.fromkeys(files))
+
+
+def iter_chunks(path: str, columns: Optional[List[str]], chunk_size: int,
+                encoding: str = 'utf-8') -> Iterator[pd.DataFrame]:
+    """
+    按块读取单个文件，只读 columns 指定的列（None 表示全部）。
+    CSV 用 read_csv(chunksize)，Parquet 用 pyarrow 的 iter_batches，内存占用与 chunk_size 成正比。
+    """
+    if path.lower().endswith(('.parquet', '.pq')):
+        import pyarrow.parquet as pq
+        pf = pq.ParquetFile(path)
+        if columns is not None:
+            available = set(pf.schema_arrow.names)
+            columns = [c for c in columns if c in available]
+        for batch in pf.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        usecols = None
+        if columns is not None:
+            wanted = set(columns)
+            usecols = lambda c: c in wanted  # noqa: E731
+        yield from pd.read_csv(path, usecols=usecols, chunksize=chunk_size, encoding=encoding)
+
+
+def write_part(df: pd.DataFrame, path: str, fmt: str):
+    """先写临时文件再 os.replace，保证分片文件要么完整存在要么不存在（可作为断点）"""
+    tmp = f'{path}.tmp'
+    write_frame(df, tmp, fmt)
+    os.replace(tmp, path)
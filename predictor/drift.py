@@ -0,0 +1,156 @@
+# predictor/drift.py
+"""
+在线漂移监控：每批打分数据向量化更新各数值特征与预测值的流式统计。
+- Welford 均值/方差（RunningStats）
+- 与训练分布对齐的固定分箱直方图 + PSI
+内存占用为 O(特征数 × 分箱数)，与处理过的样本量无关。
+
+参考分布优先取 metadata.json 的 drift_reference（train_and_save.py 按训练集分位数生成）；
+旧模型没有时，按 num_pipeline 的均值/标准差假设正态分布生成等概率分箱。
+"""
+import os
+import threading
+from statistics import NormalDist
+
+import numpy as np
+
+from .stats import RunningStats, bin_counts, psi
+from .utils import get_model_service
+
+
+class _Tracker:
+    """一组列的流式统计 + 分箱计数"""
+
+    def __init__(self, names, edges, expected):
+        self.names = list(names)
+        self.edges = np.asarray(edges, dtype=np.float64).reshape(len(self.names), -1)
+        self.expected = np.asarray(expected, dtype=np.float64).reshape(len(self.names), -1)
+        self.reset()
+
+    def reset(self):
+        self.stats = RunningStats(len(self.names))
+        self.counts = np.zeros(self.expected.shape, dtype=np.int64)
+        self.missing = np.zeros(len(self.names), dtype=np.int64)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).reshape(-1, len(self.names))
+        self.stats.update(values)
+        counts, missing = bin_counts(values, self.edges)
+        self.counts += counts
+        self.missing += missing
+
+    def summary(self, histograms=False):
+        stats = self.stats.summary(self.names)
+        scores = psi(self.counts, self.expected)
+        out = {}
+        for i, name in enumerate(self.names):
+            item = dict(stats[name], missing=int(self.missing[i]),
+                        psi=None if np.isnan(scores[i]) else float(scores[i]))
+            if histograms:
+                item.update(edges=self.edges[i].tolist(), counts=self.counts[i].tolist(),
+                            expected=self.expected[i].tolist())
+            out[name] = item
+        return out
+
+
+class DriftMonitor:
+    def __init__(self, svc=None, bins: int = 10):
+        svc = svc or get_model_service()
+        self.model_version = svc.model_version
+        self.num_features = list(svc.num_features)
+        self._lock = threading.Lock()
+        ref = getattr(svc, 'drift_reference', None) or {}
+        feat_ref = ref.get('features') or {}
+        if all(c in feat_ref for c in self.num_features):
+            edges = [feat_ref[c]['edges'] for c in self.num_features]
+            expected = [feat_ref[c]['expected'] for c in self.num_features]
+            self.reference = 'training_histogram'
+        else:
+            edges, expected = self._normal_reference(svc, bins)
+            self.reference = 'normal_approximation'
+        self.features = _Tracker(self.num_features, edges, expected)
+
+        pred_ref = ref.get('prediction')
+        if pred_ref:
+            self.prediction = _Tracker(['prediction'], pred_ref['edges'], pred_ref['expected'])
+        else:
+            # 没有训练期预测分布时无法对齐分箱，只做 Welford 统计
+            self.prediction = None
+            self.prediction_stats = RunningStats()
+
+    def _normal_reference(self, svc, bins):
+        z = np.array([NormalDist().inv_cdf(k / bins) for k in range(1, bins)])
+        affine = getattr(svc, '_num_affine', None)
+        if affine is None:
+            mean = np.zeros(len(self.num_features))
+            scale = np.ones(len(self.num_features))
+        else:
+            _, mean, scale = affine
+        edges = mean[:, None] + scale[:, None] * z[None, :]
+        expected = np.full((len(self.num_features), bins), 1.0 / bins)
+        return edges, expected
+
+    def observe(self, values, preds=None):
+        """values: (n, len(num_features)) 原始（未标准化）数值特征；preds: 对应预测值（可选）"""
+        with self._lock:
+            self.features.update(values)
+            if preds is not None:
+                if self.prediction is not None:
+                    self.prediction.update(preds)
+                else:
+                    self.prediction_stats.update(preds)
+
+    def observe_frame(self, df, preds=None):
+        self.observe(df[self.num_features].to_numpy(dtype=np.float64), preds)
+
+    def observe_records(self, records, preds=None):
+        """records: list of dict（已校验的特征），单条请求时比构造 DataFrame 更省"""
+        self.observe(np.array([[r[c] for c in self.num_features] for r in records], dtype=np.float64), preds)
+
+    def observe_trajectory(self, static, steps, step_features, preds=None):
+        """轨迹请求：来料特征按列广播，不构造逐行 dict"""
+        steps = np.asarray(steps, dtype=np.float64)
+        values = np.empty((len(steps), len(self.num_features)))
+        for i, c in enumerate(self.num_features):
+            if c in static:
+                values[:, i] = float(static[c])
+            else:
+                values[:, i] = steps[:, step_features.index(c)]
+        self.observe(values, preds)
+
+    def reset(self):
+        with self._lock:
+            self.features.reset()
+            if self.prediction is not None:
+                self.prediction.reset()
+            else:
+                self.prediction_stats = RunningStats()
+
+    def summary(self, histograms=False):
+        with self._lock:
+            if self.prediction is not None:
+                pred = self.prediction.summary(histograms)['prediction']
+            else:
+                pred = self.prediction_stats.summary()
+            return {
+                "model_version": self.model_version,
+                "reference": self.reference,
+                "features": self.features.summary(histograms),
+                "prediction": pred,
+            }
+
+
+_drift_monitor = None
+_drift_monitor_lock = threading.Lock()
+
+
+def get_drift_monitor():
+    """DRIFT_MONITOR=0 时返回 None（关闭监控）"""
+    global _drift_monitor
+    if os.environ.get("DRIFT_MONITOR", "1") == "0":
+        return None
+    if _drift_monitor is None:
+        with _drift_monitor_lock:
+            if _drift_monitor is None:
+                _drift_monitor = DriftMonitor()
+    return _drift_monitor
@@ -0,0 +1,105 @@
+# predictor/feature_store.py
+"""
+电芯来料特征库：SQLite 表（CellFeature）+ 进程内 LRU 缓存。
+缓存中同时保存原始来料特征和已经过 num_pipeline 预处理的向量，
+预测时只需电芯条码 + 工步实时数据即可。
+
+多 worker 部署时 upsert 只能清掉本进程的缓存：缓存项超过 FEATURE_STORE_REVALIDATE_SECONDS 后，
+下一次命中会按 cell_id 唯一索引只查 updated_at，与库中不一致时重新加载，
+其它 worker 最多在这段时间内读到旧特征。
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from typing import Dict, Optional
+
+from .models import CellFeature
+from .utils import get_model_service
+
+# features: 原始来料特征 dict；static_vec: 预处理后的向量（不能逐列展开时为 None）
+# updated_at: 库中记录的更新时间；checked_at: 最近一次与库核对的时间（monotonic）
+CellEntry = namedtuple('CellEntry', ['features', 'static_vec', 'model_version', 'updated_at', 'checked_at'])
+
+
+class CellFeatureStore:
+    def __init__(self, maxsize: int = None):
+        if maxsize is None:
+            maxsize = int(os.environ.get("FEATURE_STORE_CACHE_SIZE", 10000))
+        self.maxsize = maxsize
+        self.revalidate_seconds = float(os.environ.get("FEATURE_STORE_REVALIDATE_SECONDS", 5))
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, cell_id: str) -> Optional[CellEntry]:
+        """按电芯条码查询，先查 LRU（过期后只核对 updated_at），未命中再走 cell_id 唯一索引查库"""
+        svc = get_model_service()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(cell_id)
+            if entry is not None and entry.model_version != svc.model_version:
+                entry = None
+            if entry is not None and now - entry.checked_at < self.revalidate_seconds:
+                self._cache.move_to_end(cell_id)
+                self.hits += 1
+                return entry
+
+        if entry is not None:
+            updated_at = CellFeature.objects.filter(cell_id=cell_id).values_list('updated_at', flat=True).first()
+            if updated_at is not None and updated_at == entry.updated_at:
+                entry = entry._replace(checked_at=now)
+                with self._lock:
+                    self._cache[cell_id] = entry
+                    self._cache.move_to_end(cell_id)
+                    self.hits += 1
+                return entry
+        with self._lock:
+            self.misses += 1
+
+        row = CellFeature.objects.filter(cell_id=cell_id).values_list('features', 'updated_at').first()
+        if row is None:
+            with self._lock:
+                self._cache.pop(cell_id, None)
+            return None
+        features, updated_at = row
+        entry = CellEntry(features, svc.preprocess_static(features), svc.model_version, updated_at, now)
+        with self._lock:
+            self._cache[cell_id] = entry
+            self._cache.move_to_end(cell_id)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return entry
+
+    def upsert(self, items: Dict[str, dict]) -> int:
+        """批量写入/更新 {cell_id: features}，并使对应缓存失效"""
+        objs = [CellFeature(cell_id=k, features=v) for k, v in items.items()]
+        CellFeature.objects.bulk_create(
+            objs,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['cell_id'],
+            update_fields=['features', 'updated_at'],
+        )
+        with self._lock:
+            for k in items:
+                self._cache.pop(k, None)
+        return len(objs)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._cache), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+_feature_store = None
+_feature_store_lock = threading.Lock()
+
+
+def get_feature_store():
+    global _feature_store
+    if _feature_store is None:
+        with _feature_store_lock:
+            if _feature_store is None:
+                _feature_store = CellFeatureStore()
+    return _feature_store
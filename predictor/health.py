@@ -0,0 +1,147 @@
+# predictor/health.py
+"""
+存活 / 就绪探针。
+
+- 存活（/api/health/live/）：常数时间，不访问模型和数据库
+- 就绪（/api/health/ready/）：主模型（及候选模型）已加载并用代表性样本预热、数据库可写、
+  准入队列没有积压时才返回 200，否则 503
+  - 探针本身从不加载模型：未加载时在后台线程中加载 + 预热（同一时间只有一个）
+  - 加载失败后按指数退避重试（MODEL_RETRY_SECONDS 起，翻倍至 MODEL_RETRY_MAX_SECONDS），
+    退避期间的探针不再触发加载，checks.model.retry_in_seconds 给出距下次重试的秒数
+  - 数据库可写检查结果缓存 HEALTH_DB_CHECK_TTL 秒，探针频率再高也只偶尔访问一次数据库
+
+配置（环境变量）：WARMUP_ROWS、HEALTH_DB_CHECK_TTL、READY_MAX_QUEUE_DEPTH、MODEL_RETRY_SECONDS、
+MODEL_RETRY_MAX_SECONDS
+"""
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.db.migrations.recorder import MigrationRecorder
+
+from .admission import get_admission
+from .shadow import get_shadow
+from .utils import get_model_service, loaded_model_service
+
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    def __init__(self):
+        self.warmup_rows = int(os.environ.get("WARMUP_ROWS", 32))
+        self.db_check_ttl = float(os.environ.get("HEALTH_DB_CHECK_TTL", 10))
+        self.max_queue_depth = int(os.environ.get("READY_MAX_QUEUE_DEPTH", 16))
+        self.retry_seconds = float(os.environ.get("MODEL_RETRY_SECONDS", 5))
+        self.retry_max_seconds = float(os.environ.get("MODEL_RETRY_MAX_SECONDS", 300))
+        self.warmed = False
+        self.model_error = None
+        self.warmup_seconds = None
+        self.failed_attempts = 0
+        self._next_retry_at = 0.0
+        self._loading = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db_status = None
+        self._db_checked_at = 0.0
+
+    def load_and_warm(self):
+        """加载主模型与候选模型并预热（阻塞）；启动时调用，或由 ensure_loading() 在后台线程中调用"""
+        if not self._loading.acquire(blocking=False):
+            return
+        try:
+            t0 = time.perf_counter()
+            get_model_service().warm_up(self.warmup_rows)
+            candidate = get_shadow().candidate()
+            if candidate is not None:
+                candidate.warm_up(self.warmup_rows)
+            self.warmup_seconds = round(time.perf_counter() - t0, 3)
+            self.model_error = None
+            self.failed_attempts = 0
+            self._next_retry_at = 0.0
+            self.warmed = True
+        except Exception as e:
+            self.model_error = str(e)
+            self.failed_attempts += 1
+            delay = min(self.retry_max_seconds, self.retry_seconds * 2 ** (self.failed_attempts - 1))
+            self._next_retry_at = time.monotonic() + delay
+            logger.exception("Readiness: model load / warm-up failed (attempt %d, next retry in %.0fs)",
+                             self.failed_attempts, delay)
+        finally:
+            self._loading.release()
+
+    def ensure_loading(self):
+        """未就绪、没有在加载且不在失败退避期内时，在后台线程中加载 + 预热，立即返回"""
+        if self.warmed or self._loading.locked() or time.monotonic() < self._next_retry_at:
+            return
+        threading.Thread(target=self.load_and_warm, name='model-warmup', daemon=True).start()
+
+    def retry_in_seconds(self):
+        """距下次允许重试加载的秒数；不在退避期内时为 None"""
+        remaining = self._next_retry_at - time.monotonic()
+        return round(remaining, 1) if remaining > 0 and not self.warmed else None
+
+    def check_db(self):
+        """各数据库能否写入（对 django_migrations 执行一次不命中任何行的 DELETE），结果按 TTL 缓存"""
+        now = time.monotonic()
+        if self._db_status is not None and now - self._db_checked_at < self.db_check_ttl:
+            return self._db_status
+        if not self._db_lock.acquire(blocking=False):
+            # 其它探针正在检查：沿用上一次结果
+            return self._db_status or {}
+        try:
+            table = MigrationRecorder.Migration._meta.db_table
+            result = {}
+            for alias in settings.DATABASES:
+                try:
+                    with connections[alias].cursor() as cursor:
+                        cursor.execute(f"DELETE FROM {table} WHERE id = -1")
+                    result[alias] = "ok"
+                except Exception as e:
+                    result[alias] = str(e)
+            self._db_status = result
+            self._db_checked_at = now
+            return result
+        finally:
+            self._db_lock.release()
+
+    def status(self):
+        """返回 (是否就绪, 详情)"""
+        reasons = []
+        if loaded_model_service() is None or not self.warmed:
+            self.ensure_loading()
+            reasons.append("model_error" if self.model_error else "model_not_ready")
+
+        db = self.check_db()
+        if not db or any(v != "ok" for v in db.values()):
+            reasons.append("db_not_writable")
+
+        admission = get_admission().summary()
+        queue_depth = sum(admission["queue_depth"].values())
+        if queue_depth > self.max_queue_depth:
+            reasons.append("queue_backlog")
+        shadow = get_shadow()
+
+        checks = {
+            "model": {"warmed": self.warmed, "warmup_seconds": self.warmup_seconds, "error": self.model_error,
+                      "failed_attempts": self.failed_attempts, "retry_in_seconds": self.retry_in_seconds()},
+            "db": db,
+            "queue": {"depth": queue_depth, "max_depth": self.max_queue_depth,
+                      "inflight": admission["inflight"], "rows_in_flight": admission["rows_in_flight"]},
+            "shadow": {"pending": shadow.pending, "max_pending": shadow.max_pending},
+        }
+        return not reasons, {"reasons": reasons, "checks": checks}
+
+
+_readiness = None
+_readiness_lock = threading.Lock()
+
+
+def get_readiness():
+    global _readiness
+    if _readiness is None:
+        with _readiness_lock:
+            if _readiness is None:
+                _readiness = Readiness()
+    return _readiness
@@ -0,0 +1,192 @@
+# predictor/idempotency.py
+"""
+Idempotency-Key 支持：客户端重试同一个请求时直接返回第一次的响应，不重新校验、推理和写库。
+
+- 进程内有界 LRU（IDEMPOTENCY_MAX_ENTRIES）+ TTL（IDEMPOTENCY_TTL_SECONDS）
+- IDEMPOTENCY_DB=1 时同时写入 IdempotencyRecord 表（SQLite），进程重启 / 多 worker 间也能命中
+- 同一个 key 的并发请求：第一个请求负责计算，其余请求等待其完成（最多 IDEMPOTENCY_WAIT_SECONDS）后复用结果
+- 同一个 key 配不同请求体：返回 422
+- 只缓存非 5xx、非 429 的响应；失败的请求可以用同一个 key 重试
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import timedelta
+
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from .models import IdempotencyRecord
+
+logger = logging.getLogger(__name__)
+
+StoredResponse = namedtuple('StoredResponse', ['fingerprint', 'status_code', 'content', 'content_type', 'expires_at'])
+
+
+class IdempotencyStore:
+    def __init__(self):
+        self.max_entries = int(os.environ.get("IDEMPOTENCY_MAX_ENTRIES", 10000))
+        self.ttl = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", 24 * 3600))
+        self.wait_seconds = float(os.environ.get("IDEMPOTENCY_WAIT_SECONDS", 30))
+        self.use_db = os.environ.get("IDEMPOTENCY_DB", "0") == "1"
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.replayed = 0
+
+    def _get_cached(self, key):
+        """调用方持有 _lock"""
+        entry = self._cache.get(key)
+        if entry is not None:
+            if entry.expires_at > time.time():
+                self._cache.move_to_end(key)
+                return entry
+            del self._cache[key]
+        return None
+
+    def _get_db(self, key):
+        if not self.use_db:
+            return None
+        rec = IdempotencyRecord.objects.filter(key=key, expires_at__gt=timezone.now()).first()
+        if rec is None:
+            return None
+        return StoredResponse(rec.fingerprint, rec.status_code, rec.content.encode('utf-8'), rec.content_type,
+                              rec.expires_at.timestamp())
+
+    def _put_cached(self, key, entry):
+        """调用方持有 _lock"""
+        self._cache[key] = entry
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def begin(self, key):
+        """
+        返回 ('cached', StoredResponse) / ('owner', None) / ('timeout', None)。
+        'owner' 表示由当前请求负责计算，结束后必须调用 complete() 或 abort()。
+        """
+        deadline = time.monotonic() + self.wait_seconds
+        while True:
+            with self._lock:
+                entry = self._get_cached(key)
+                if entry is not None:
+                    return 'cached', entry
+                event = self._inflight.get(key)
+                if event is None:
+                    self._inflight[key] = threading.Event()
+                    break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not event.wait(remaining):
+                return 'timeout', None
+
+        # 本进程内没有，再查数据库（可能由其它 worker 写入）
+        try:
+            entry = self._get_db(key)
+        except Exception:
+            logger.exception("Idempotency: failed to read %s", key)
+            entry = None
+        if entry is not None:
+            with self._lock:
+                self._put_cached(key, entry)
+                self._inflight.pop(key).set()
+            return 'cached', entry
+        return 'owner', None
+
+    def complete(self, key, fingerprint, response):
+        entry = StoredResponse(fingerprint, response.status_code, bytes(response.content),
+                               response.get('Content-Type', 'application/json'), time.time() + self.ttl)
+        if self.use_db:
+            try:
+                self._save_db(key, entry)
+            except Exception:
+                logger.exception("Idempotency: failed to persist %s", key)
+        with self._lock:
+            self._put_cached(key, entry)
+            self._inflight.pop(key).set()
+
+    def abort(self, key):
+        with self._lock:
+            event = self._inflight.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def _save_db(self, key, entry):
+        expires_at = timezone.now() + timedelta(seconds=self.ttl)
+        IdempotencyRecord.objects.update_or_create(key=key, defaults={
+            'fingerprint': entry.fingerprint,
+            'status_code': entry.status_code,
+            'content': entry.content.decode('utf-8'),
+            'content_type': entry.content_type,
+            'expires_at': expires_at,
+        })
+        self._writes += 1
+        if self._writes % 100 == 0:
+            # 顺带清理过期记录（expires_at 有索引）
+            IdempotencyRecord.objects.filter(expires_at__lte=timezone.now()).delete()
+
+    def summary(self):
+        with self._lock:
+            return {"entries": len(self._cache), "inflight": len(self._inflight), "replayed": self.replayed,
+                    "db": self.use_db}
+
+
+_idempotency_store = None
+_idempotency_store_lock = threading.Lock()
+
+
+def get_idempotency_store():
+    global _idempotency_store
+    if _idempotency_store is None:
+        with _idempotency_store_lock:
+            if _idempotency_store is None:
+                _idempotency_store = IdempotencyStore()
+    return _idempotency_store
+
+
+class IdempotentPostMixin:
+    """
+    POST 请求带 Idempotency-Key 头时启用：在 dispatch 最外层判断，命中时不进入准入控制、校验和推理。
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        idem_key = request.META.get('HTTP_IDEMPOTENCY_KEY')
+        if request.method != 'POST' or not idem_key:
+            return super().dispatch(request, *args, **kwargs)
+        if len(idem_key) > 200:
+            return JsonResponse({"error": "invalid_idempotency_key"}, status=400)
+
+        store = get_idempotency_store()
+        key = f"{request.path}|{idem_key}"
+        fingerprint = hashlib.sha256(request.body).hexdigest()
+        outcome, entry = store.begin(key)
+        if outcome == 'timeout':
+            return JsonResponse({"error": "idempotency_key_in_progress"}, status=409)
+        if outcome == 'cached':
+            return self._replay(store, entry, fingerprint)
+
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code >= 500 or response.status_code == 429:
+                store.abort(key)
+                return response
+            if hasattr(response, 'render') and not getattr(response, 'is_rendered', True):
+                response.render()
+            store.complete(key, fingerprint, response)
+            return response
+        except BaseException:
+            store.abort(key)
+            raise
+
+    @staticmethod
+    def _replay(store, entry, fingerprint):
+        if entry.fingerprint != fingerprint:
+            return JsonResponse({"error": "idempotency_key_reused",
+                                 "detail": "Idempotency-Key was used with a different request body"}, status=422)
+        store.replayed += 1
+        response = HttpResponse(entry.content, status=entry.status_code, content_type=entry.content_type)
+        response['Idempotent-Replayed'] = 'true'
+        return response
@@ -0,0 +1,191 @@
+# predictor/management/commands/evaluate_models.py
+"""
+离线评估已发布的模型版本：
+    python manage.py evaluate_models [--dataset dataset_cache/dataset_xxx.parquet] [--versions v1,v2] \
+        --output eval_report.json
+
+- 数据集默认取 --cache-dir 下最新的 train_and_save.py 缓存（dataset_*.parquet / .feather）
+- 只用留出电芯打分：剔除所有参与评估的版本 metadata 中 train_cells 的并集，各版本在同一批行上比较
+- 各版本在独立子进程中并行评估（模型只加载一次，整批向量化推理），每个子进程的 CatBoost 线程数
+  为 CPU 数 / 并行数，吞吐量之间可比；子进程各自测量加载耗时与加载模型前后的 RSS 增量
+- 报告：整体与按工步序号的 RMSE / MAE、rows/sec、加载耗时、内存占用，写成 JSON
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+
+from predictor.utils import ModelService, list_model_versions, resolve_model_dir
+
+CELL_COL = '电芯条码'
+TARGET_COL = '单体电压'
+STEP_COL = '工步序号'
+
+
+def _rss_mb():
+    """当前进程 RSS（MB）；没有 /proc 时退回峰值 RSS，都不支持时返回 None"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10)
+
+
+def _error_metrics(err, steps):
+    """整体与按工步的 RMSE / MAE（bincount 一次算完所有工步）；工步缺失（NaN）的行计入整体，按工步归到 missing"""
+    codes, uniq = pd.factorize(steps, sort=True)
+    known = codes >= 0          # factorize 把 NaN 编码为 -1
+    n = np.bincount(codes[known], minlength=len(uniq))
+    sse = np.bincount(codes[known], weights=(err * err)[known], minlength=len(uniq))
+    sae = np.bincount(codes[known], weights=np.abs(err)[known], minlength=len(uniq))
+    per_step = {}
+    for i, step in enumerate(uniq):
+        key = str(int(step)) if float(step).is_integer() else str(step)
+        per_step[key] = {"rows": int(n[i]), "rmse": float(np.sqrt(sse[i] / n[i])), "mae": float(sae[i] / n[i])}
+    if not known.all():
+        missing = err[~known]
+        per_step["missing"] = {"rows": int(len(missing)), "rmse": float(np.sqrt(np.mean(missing * missing))),
+                               "mae": float(np.mean(np.abs(missing)))}
+    overall = {"rows": int(len(err)), "rmse": float(np.sqrt(np.mean(err * err))), "mae": float(np.mean(np.abs(err)))}
+    return overall, per_step
+
+
+def evaluate_version(version, data_path, thread_count):
+    """在当前进程中加载并评估一个版本；作为子进程任务运行，返回可 JSON 序列化的结果"""
+    df = pd.read_feather(data_path)
+    rss_before = _rss_mb()
+    t0 = time.perf_counter()
+    svc = ModelService(version)
+    load_seconds = time.perf_counter() - t0
+    rss_after = _rss_mb()
+
+    t0 = time.perf_counter()
+    preds = svc.predict(df, thread_count=thread_count)
+    predict_seconds = time.perf_counter() - t0
+
+    err = np.asarray(preds, dtype=np.float64) - df[TARGET_COL].to_numpy(dtype=np.float64)
+    overall, per_step = _error_metrics(err, df[STEP_COL].to_numpy())
+    return {
+        "model_version": svc.model_version,
+        "load_seconds": round(load_seconds, 4),
+        "model_memory_mb": None if rss_before is None else round(rss_after - rss_before, 1),
+        "model_file_mb": round(os.path.getsize(svc.model_path) / 2 ** 20, 2),
+        "predict_seconds": round(predict_seconds, 4),
+        "rows_per_sec": round(len(df) / max(predict_seconds, 1e-9), 1),
+        "thread_count": thread_count,
+        "overall": overall,
+        "per_step": per_step,
+    }
+
+
+class Command(BaseCommand):
+    help = "在留出电芯上评估所有已发布模型版本的精度（按工步）与推理开销，输出 JSON 报告"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dataset', default=None, help='数据集文件（parquet/feather），缺省取 --cache-dir 中最新的缓存')
+        parser.add_argument('--cache-dir', default='./dataset_cache')
+        parser.add_argument('--versions', default='', help='要评估的版本，逗号分隔；缺省为全部已发布版本')
+        parser.add_argument('--output', default=None, help='报告路径，缺省 eval_report_<时间>.json')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='并行评估的版本数')
+
+    def handle(self, *args, **opts):
+        dataset = opts['dataset'] or self._latest_dataset(opts['cache_dir'])
+        versions = [v for v in opts['versions'].split(',') if v] or list_model_versions()
+        if not versions:
+            # 旧的平铺布局：只有当前模型
+            versions = [None]
+
+        train_cells = set()
+        for v in versions:
+            meta_path = os.path.join(resolve_model_dir(v), 'metadata.json')
+            if not os.path.exists(meta_path):
+                raise CommandError(f"Unknown model version: {v}")
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                cells = json.load(f).get('train_cells')
+            if cells is None:
+                self.stderr.write(f"Warning: {v or 'current'} has no train_cells in metadata; "
+                                  f"its training rows cannot be excluded")
+            train_cells.update(cells or [])
+
+        df = pd.read_parquet(dataset) if dataset.lower().endswith(('.parquet', '.pq')) else pd.read_feather(dataset)
+        for c in (CELL_COL, TARGET_COL, STEP_COL):
+            if c not in df.columns:
+                raise CommandError(f"Dataset is missing column {c}")
+        df = df[~df[CELL_COL].astype(str).isin(train_cells)].reset_index(drop=True)
+        if df.empty:
+            raise CommandError("No held-out cells left after excluding train_cells")
+        if isinstance(df[CELL_COL].dtype, pd.CategoricalDtype):
+            df[CELL_COL] = df[CELL_COL].cat.remove_unused_categories()
+        n_cells = int(df[CELL_COL].nunique())
+        self.stdout.write(f"Held-out: cells={n_cells}, rows={len(df)}, versions={len(versions)}")
+
+        workers = max(1, min(opts['workers'], len(versions)))
+        thread_count = max(1, (os.cpu_count() or 1) // workers)
+        results = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            # 子进程从 feather 读取留出集（比 pickle 传参快，且不在父进程多留一份副本）
+            data_path = os.path.join(tmp, 'held_out.feather')
+            df.to_feather(data_path)
+            del df
+            if workers == 1:
+                for v in versions:
+                    results[v] = self._safe_evaluate(v, data_path, thread_count)
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    futures = {v: pool.submit(evaluate_version, v, data_path, thread_count) for v in versions}
+                    for v, fut in futures.items():
+                        try:
+                            results[v] = fut.result()
+                        except Exception as e:
+                            results[v] = {"error": str(e)}
+
+        report = {
+            "dataset": os.path.abspath(dataset),
+            "generated_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "held_out_cells": n_cells,
+            "excluded_train_cells": len(train_cells),
+            "versions": {(v or r.get("model_version") or 'current'): r for v, r in results.items()},
+        }
+        output = opts['output'] or time.strftime('eval_report_%Y%m%d%H%M%S.json')
+        tmp_out = f"{output}.tmp"
+        with open(tmp_out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_out, output)
+
+        for name, r in report["versions"].items():
+            if "error" in r:
+                self.stdout.write(f"{name}: error={r['error']}")
+                continue
+            self.stdout.write(f"{name}: rmse={r['overall']['rmse']:.5f}, mae={r['overall']['mae']:.5f}, "
+                              f"rows/sec={r['rows_per_sec']:.0f}, load={r['load_seconds']:.2f}s, "
+                              f"mem={r['model_memory_mb']}MB")
+        self.stdout.write(self.style.SUCCESS(f"Report written to {output}"))
+
+    @staticmethod
+    def _safe_evaluate(version, data_path, thread_count):
+        try:
+            return evaluate_version(version, data_path, thread_count)
+        except Exception as e:
+            return {"error": str(e)}
+
+    @staticmethod
+    def _latest_dataset(cache_dir):
+        if not os.path.isdir(cache_dir):
+            raise CommandError(f"No --dataset given and cache dir {cache_dir} does not exist")
+        candidates = [os.path.join(cache_dir, n) for n in os.listdir(cache_dir)
+                      if n.startswith('dataset_') and n.endswith(('.parquet', '.feather'))]
+        if not candidates:
+            raise CommandError(f"No cached dataset found in {cache_dir}")
+        return max(candidates, key=os.path.getmtime)
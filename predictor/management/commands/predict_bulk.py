@@ -0,0 +1,128 @@
+# predictor/management/commands/predict_bulk.py
+"""
+离线批量打分：
+    python manage.py predict_bulk <文件或目录> [...] --output-dir out/ --format parquet
+
+- 输入支持 CSV / Parquet，目录会展开其中的 csv/parquet（如 train_and_save.py 用的 pack 文件目录）
+- 按块读取，只读 feature_cols + --keep-columns 指定的列
+- 主线程读取下一块的同时，线程池并发做预处理、推理和写出（CatBoost 推理会释放 GIL，模型只加载一次）；
+  每次推理的 CatBoost 线程数为 CPU 数 / --workers，并发的块之间不会超额占用核心
+- 第一块读出后即检查特征列与 --keep-columns 是否齐全，缺列时直接报错而不是在每块推理时失败
+- 每块结果写成一个分片文件 <output-dir>/<输入文件名>-<路径摘要>/part-XXXXX.<ext>，分片原子写入即为断点；
+  重跑同一命令会跳过已完成的分片 / 文件
+"""
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from predictor.bulk_io import iter_input_files, iter_chunks, write_part
+from predictor.utils import get_model_service
+
+
+class Command(BaseCommand):
+    help = "对 CSV/Parquet 文件（或目录）做离线批量预测，按块流水线处理，可断点续跑"
+
+    def add_arguments(self, parser):
+        parser.add_argument('inputs', nargs='+', help='输入文件或目录')
+        parser.add_argument('--output-dir', required=True, help='结果输出目录')
+        parser.add_argument('--format', choices=['parquet', 'csv'], default='parquet', help='输出格式')
+        parser.add_argument('--chunk-size', type=int, default=int(os.environ.get("PREDICT_CHUNK_SIZE", 50000)))
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='推理/写出线程数')
+        parser.add_argument('--keep-columns', default='', help='原样带到输出的列，逗号分隔（如 电芯条码,工步序号）')
+        parser.add_argument('--encoding', default='utf-8', help='CSV 输入编码（如 gbk）')
+        parser.add_argument('--restart', action='store_true', help='忽略已有断点，全部重新计算')
+
+    def handle(self, *args, **opts):
+        files = iter_input_files(opts['inputs'])
+        if not files:
+            raise CommandError("No input files found")
+        svc = get_model_service()
+        keep = [c for c in opts['keep_columns'].split(',') if c]
+        columns = list(dict.fromkeys(svc.feature_cols + keep))
+        out_root = opts['output_dir']
+        os.makedirs(out_root, exist_ok=True)
+
+        thread_count = max(1, (os.cpu_count() or 1) // opts['workers'])
+        total_rows = 0
+        t_start = time.time()
+        with ThreadPoolExecutor(max_workers=opts['workers']) as pool:
+            for path in files:
+                total_rows += self._run_file(pool, svc, path, columns, keep, out_root, thread_count, opts)
+        elapsed = time.time() - t_start
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: files={len(files)}, rows={total_rows}, elapsed={elapsed:.2f}s, "
+            f"rows/sec={total_rows / max(elapsed, 1e-9):.0f}"))
+
+    def _run_file(self, pool, svc, path, columns, keep, out_root, thread_count, opts):
+        out_dir = os.path.join(out_root, self._out_name(path))
+        if opts['restart']:
+            shutil.rmtree(out_dir, ignore_errors=True)
+        os.makedirs(out_dir, exist_ok=True)
+        done_marker = os.path.join(out_dir, '_SUCCESS')
+        meta_path = os.path.join(out_dir, '_meta.json')
+        meta = {"source": os.path.abspath(path), "chunk_size": opts['chunk_size'], "format": opts['format'],
+                "model_version": svc.model_version, "keep_columns": keep}
+
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                old_meta = json.load(f)
+            if old_meta != meta:
+                raise CommandError(f"{out_dir} was produced with different options {old_meta}; use --restart")
+            if os.path.exists(done_marker):
+                self.stdout.write(f"Skip {path}: already done")
+                return 0
+
+        # iter_chunks 会静默跳过文件中不存在的列：先用第一块检查，再写断点元数据
+        chunks = iter_chunks(path, columns, opts['chunk_size'], encoding=opts['encoding'])
+        first = next(chunks, None)
+        if first is not None:
+            missing = [c for c in columns if c not in first.columns]
+            if missing:
+                raise CommandError(f"{path} is missing columns: {missing}")
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+
+        ext = 'parquet' if opts['format'] == 'parquet' else 'csv'
+        max_pending = opts['workers'] * 2
+        pending = deque()
+        rows = skipped = 0
+        t0 = time.time()
+        for idx, chunk in enumerate(itertools.chain([first] if first is not None else [], chunks)):
+            part_path = os.path.join(out_dir, f'part-{idx:05d}.{ext}')
+            if os.path.exists(part_path):
+                skipped += len(chunk)
+                continue
+            pending.append(pool.submit(self._score_part, svc, chunk, keep, part_path, opts['format'],
+                                       thread_count))
+            # 限制在途分块数量，读取速度快于推理时不会无限占用内存
+            while len(pending) >= max_pending:
+                rows += pending.popleft().result()
+        while pending:
+            rows += pending.popleft().result()
+        open(done_marker, 'w').close()
+
+        elapsed = time.time() - t0
+        self.stdout.write(f"{path}: rows={rows}, resumed_rows={skipped}, elapsed={elapsed:.2f}s, "
+                          f"rows/sec={rows / max(elapsed, 1e-9):.0f}")
+        return rows
+
+    @staticmethod
+    def _out_name(path):
+        """输出子目录名：文件名（含扩展名）+ 绝对路径摘要，a.csv 与 a.parquet、不同目录下的同名文件互不冲突"""
+        digest = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:8]
+        return f"{os.path.basename(path)}-{digest}"
+
+    @staticmethod
+    def _score_part(svc, chunk, keep, part_path, fmt, thread_count):
+        preds = svc.predict(chunk, thread_count=thread_count)
+        out = chunk[keep].copy() if keep else chunk.iloc[:, :0].copy()
+        out['prediction'] = preds
+        write_part(out, part_path, fmt)
+        return len(out)
@@ -0,0 +1,25 @@
+# predictor/management/commands/reap_predictions.py
+"""
+清理文件预测结果目录（MEDIA_ROOT/predictions/），可放进 cron：
+    python manage.py reap_predictions --max-disk-mb 2048 --max-age-hours 72
+"""
+from django.core.management.base import BaseCommand
+
+from predictor.results import reap
+
+
+class Command(BaseCommand):
+    help = "按保存时长和磁盘预算清理文件预测结果"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-disk-mb', type=int, default=None, help='缺省取 settings.PREDICTION_MAX_DISK_MB')
+        parser.add_argument('--max-age-hours', type=float, default=None,
+                            help='缺省取 settings.PREDICTION_MAX_AGE_HOURS')
+
+    def handle(self, *args, **opts):
+        max_bytes = None if opts['max_disk_mb'] is None else opts['max_disk_mb'] * 1024 * 1024
+        max_age = None if opts['max_age_hours'] is None else opts['max_age_hours'] * 3600
+        stats = reap(max_bytes=max_bytes, max_age_seconds=max_age)
+        self.stdout.write(self.style.SUCCESS(
+            f"removed={stats['removed']}, freed={stats['freed_bytes'] / 2 ** 20:.1f}MB, "
+            f"remaining={stats['remaining_bytes'] / 2 ** 20:.1f}MB"))
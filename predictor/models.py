@@ -19,3 +19,34 @@ class PredictionRecord(models.Model):
 
     def __str__(self):
         return f"Prediction {self.id} - {self.prediction}"
+
+
+class CellFeature(models.Model):
+    """
+    电芯来料特征库：按电芯条码存一份来料特征（原始值），预测时按条码关联
+    """
+    cell_id = models.CharField(max_length=64, unique=True)
+    # 来料特征原始值 {"来料...": value, ...}
+    features = models.JSONField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"CellFeature {self.cell_id}"
+
+
+class IdempotencyRecord(models.Model):
+    """
+    Idempotency-Key 对应的已完成响应（可选持久化，IDEMPOTENCY_DB=1 时启用）
+    """
+    # 请求路径 + Idempotency-Key
+    key = models.CharField(max_length=255, unique=True)
+    # 请求体 sha256，同一个 key 配不同请求体时拒绝
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.IntegerField()
+    content = models.TextField()
+    content_type = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Idempotency {self.key} - {self.status_code}"
@@ -0,0 +1,250 @@
+# predictor/profiling.py
+"""
+生产 worker 的按需性能剖析（默认关闭，关闭时每个请求只多一次布尔判断）。
+
+- 按 sample_rate 抽样请求，两种模式：
+  - stack：后台线程每 interval_ms 采样一次被抽中请求所在线程的调用栈，汇总为 collapsed stacks
+    （flamegraph.pl / speedscope 可直接打开），开销低
+  - cprofile：对被抽中的请求运行 cProfile，按视图累加，输出 .prof（snakeviz 等可打开）
+- 文件预测请求另用 tracemalloc 记录内存分配峰值（仅在被抽中的文件请求执行期间开启）
+- 结果写到 PROFILE_DIR/<视图名>.collapsed / <视图名>.prof，可通过 /api/admin/profiling/ 开关与下载
+
+配置（环境变量，运行期可经接口修改）：PROFILING_ENABLED、PROFILE_MODE、PROFILE_SAMPLE_RATE、
+PROFILE_INTERVAL_MS、PROFILE_DIR
+"""
+import cProfile
+import functools
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+
+from django.conf import settings
+
+MODES = ('stack', 'cprofile')
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = os.environ.get("PROFILING_ENABLED", "0") == "1"
+        self.mode = os.environ.get("PROFILE_MODE", "stack")
+        self.sample_rate = float(os.environ.get("PROFILE_SAMPLE_RATE", 0.01))
+        self.interval = float(os.environ.get("PROFILE_INTERVAL_MS", 5)) / 1000
+        self.out_dir = os.environ.get("PROFILE_DIR") or os.path.join(settings.BASE_DIR, "profiles")
+        self._lock = threading.Lock()
+        self._active = {}           # 线程 id -> 视图名（stack 模式下正在采样的请求）
+        self._stacks = {}           # 视图名 -> Counter(collapsed stack -> 次数)
+        self._pstats = {}           # 视图名 -> pstats.Stats
+        self._sampler = None
+        self._tracemalloc_users = 0
+        self._cprofile_lock = threading.Lock()
+        self._local = threading.local()   # 同一线程内嵌套的采样点（如请求内的 preprocess）只记在最外层
+        self.sampled = Counter()
+        self.memory_peaks = deque(maxlen=100)
+
+    def configure(self, enabled=None, mode=None, sample_rate=None, interval_ms=None):
+        with self._lock:
+            if mode is not None:
+                if mode not in MODES:
+                    raise ValueError(f"mode must be one of {MODES}")
+                self.mode = mode
+            if sample_rate is not None:
+                self.sample_rate = min(1.0, max(0.0, float(sample_rate)))
+            if interval_ms is not None:
+                self.interval = max(0.001, float(interval_ms) / 1000)
+            if enabled is not None:
+                self.enabled = bool(enabled)
+
+    def should_sample(self):
+        return self.enabled and random.random() < self.sample_rate
+
+    # --- stack 采样 --------------------------------------------------------
+    def _ensure_sampler(self):
+        with self._lock:
+            if self._sampler is None or not self._sampler.is_alive():
+                self._sampler = threading.Thread(target=self._sample_loop, name='profile-sampler', daemon=True)
+                self._sampler.start()
+
+    def _sample_loop(self):
+        while self.enabled:
+            time.sleep(self.interval)
+            with self._lock:
+                active = dict(self._active)
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for ident, view in active.items():
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                key = ';'.join([view] + stack[::-1])
+                with self._lock:
+                    self._stacks.setdefault(view, Counter())[key] += 1
+
+    # --- 请求包装 ----------------------------------------------------------
+    def run(self, view_name, func, track_memory=False):
+        """在剖析下执行 func()（调用方已确认需要采样）"""
+        if getattr(self._local, 'active', False):
+            return func()
+        if self.mode == 'cprofile':
+            # Python 3.12+ 同一进程只能有一个活动的 profiler：已有采样中的请求时本次不剖析
+            if not self._cprofile_lock.acquire(blocking=False):
+                return func()
+            try:
+                prof = cProfile.Profile()
+                try:
+                    prof.enable()
+                except ValueError:
+                    # 其它剖析 / 覆盖率工具占用了 profiler
+                    return func()
+                try:
+                    return self._run_sampled(view_name, func, track_memory)
+                finally:
+                    prof.disable()
+                    with self._lock:
+                        if view_name in self._pstats:
+                            self._pstats[view_name].add(prof)
+                        else:
+                            self._pstats[view_name] = pstats.Stats(prof)
+            finally:
+                self._cprofile_lock.release()
+
+        ident = threading.get_ident()
+        with self._lock:
+            self._active[ident] = view_name
+        self._ensure_sampler()
+        try:
+            return self._run_sampled(view_name, func, track_memory)
+        finally:
+            with self._lock:
+                self._active.pop(ident, None)
+
+    def _run_sampled(self, view_name, func, track_memory):
+        self._local.active = True
+        with self._lock:
+            self.sampled[view_name] += 1
+        if track_memory:
+            self._start_tracemalloc()
+        try:
+            return func()
+        finally:
+            self._local.active = False
+            if track_memory:
+                self._stop_tracemalloc(view_name)
+
+    def _start_tracemalloc(self):
+        with self._lock:
+            if self._tracemalloc_users == 0:
+                tracemalloc.start()
+            else:
+                tracemalloc.reset_peak()
+            self._tracemalloc_users += 1
+
+    def _stop_tracemalloc(self, view_name):
+        with self._lock:
+            _, peak = tracemalloc.get_traced_memory()
+            self.memory_peaks.append({"view": view_name, "peak_mb": round(peak / 2 ** 20, 2), "ts": time.time()})
+            self._tracemalloc_users -= 1
+            if self._tracemalloc_users == 0:
+                tracemalloc.stop()
+
+    # --- 输出 --------------------------------------------------------------
+    def flush(self):
+        """把当前汇总结果写入 out_dir，返回写出的文件列表"""
+        os.makedirs(self.out_dir, exist_ok=True)
+        written = []
+        with self._lock:
+            stacks = {k: dict(v) for k, v in self._stacks.items()}
+            stats = dict(self._pstats)
+        for view, counter in stacks.items():
+            path = os.path.join(self.out_dir, f"{view}.collapsed")
+            with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+                for stack, count in sorted(counter.items()):
+                    f.write(f"{stack} {count}\n")
+            os.replace(f"{path}.tmp", path)
+            written.append(path)
+        for view, st in stats.items():
+            path = os.path.join(self.out_dir, f"{view}.prof")
+            with self._lock:
+                st.dump_stats(f"{path}.tmp")
+            os.replace(f"{path}.tmp", path)
+            written.append(path)
+        return written
+
+    def latest_path(self, view_name):
+        """优先返回与当前模式对应的输出文件"""
+        self.flush()
+        exts = ('.collapsed', '.prof') if self.mode == 'stack' else ('.prof', '.collapsed')
+        for ext in exts:
+            path = os.path.join(self.out_dir, f"{view_name}{ext}")
+            if os.path.exists(path):
+                return path
+        return None
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self._pstats.clear()
+            self.sampled.clear()
+            self.memory_peaks.clear()
+
+    def summary(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "mode": self.mode,
+                "sample_rate": self.sample_rate,
+                "interval_ms": self.interval * 1000,
+                "out_dir": str(self.out_dir),
+                "sampled": dict(self.sampled),
+                "views": sorted(set(self._stacks) | set(self._pstats)),
+                "memory_peaks": list(self.memory_peaks),
+            }
+
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler():
+    global _profiler
+    if _profiler is None:
+        with _profiler_lock:
+            if _profiler is None:
+                _profiler = Profiler()
+    return _profiler
+
+
+def profiled(name):
+    """函数级采样点（用于 ModelService.preprocess 等不经过视图的调用，如 predict_bulk）"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler = get_profiler()
+            if not profiler.should_sample():
+                return func(*args, **kwargs)
+            return profiler.run(name, lambda: func(*args, **kwargs))
+        return wrapper
+    return decorator
+
+
+class ProfilingMixin:
+    """视图剖析：关闭时直接走原 dispatch；profile_memory=True 的视图额外记录 tracemalloc 峰值"""
+    profile_memory = False
+
+    def dispatch(self, request, *args, **kwargs):
+        profiler = get_profiler()
+        if not profiler.should_sample():
+            return super().dispatch(request, *args, **kwargs)
+        return profiler.run(type(self).__name__,
+                            lambda: super(ProfilingMixin, self).dispatch(request, *args, **kwargs),
+                            track_memory=self.profile_memory)
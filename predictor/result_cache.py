@@ -0,0 +1,89 @@
+# predictor/result_cache.py
+"""
+预测结果缓存：按 (模型版本, 原始特征向量) 做 key，预测值和 SHAP 解释共用同一个 key。
+- /api/predict/ 命中时跳过推理，未命中时写入预测值
+- /api/predict/batch/ 只对未命中的行推理，并回填这些行的预测值
+- /api/explain/ 命中且已有 SHAP 时直接返回，否则整批计算后回填
+进程内 LRU，容量由 RESULT_CACHE_SIZE 配置（0 表示关闭）。
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def row_keys(svc, data):
+    """
+    按 feature_cols 顺序对每行原始特征取摘要。data 为 DataFrame 或 list of dict（单条请求不必构造 DataFrame）。
+    数值列统一为 float64，保证 1 与 1.0 命中同一个 key。
+    """
+    prefix = str(svc.model_version).encode('utf-8') + b'|'
+    cols = svc.feature_cols
+    if svc.cat_features:
+        if isinstance(data, list):
+            rows = [[str(r[c]) for c in cols] for r in data]
+        else:
+            rows = data[cols].astype(str).to_numpy()
+        payloads = ['\x1f'.join(r).encode('utf-8') for r in rows]
+    else:
+        if isinstance(data, list):
+            arr = np.array([[r[c] for c in cols] for r in data], dtype=np.float64)
+        else:
+            arr = np.ascontiguousarray(data[cols].to_numpy(dtype=np.float64))
+        payloads = [r.tobytes() for r in arr]
+    return [hashlib.blake2b(prefix + p, digest_size=16).digest() for p in payloads]
+
+
+class ResultCache:
+    def __init__(self, maxsize: int = None):
+        if maxsize is None:
+            maxsize = int(os.environ.get("RESULT_CACHE_SIZE", 50000))
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys):
+        """返回与 keys 等长的列表，未命中为 None；值为 {"prediction": float, "shap": ndarray 或 None}"""
+        out = []
+        with self._lock:
+            for k in keys:
+                v = self._data.get(k)
+                if v is None:
+                    self.misses += 1
+                else:
+                    self._data.move_to_end(k)
+                    self.hits += 1
+                out.append(v)
+        return out
+
+    def put_many(self, keys, predictions, shap=None):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            for i, k in enumerate(keys):
+                self._data[k] = {"prediction": float(predictions[i]),
+                                 "shap": None if shap is None else shap[i]}
+                self._data.move_to_end(k)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def summary(self):
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    global _result_cache
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = ResultCache()
+    return _result_cache
@@ -0,0 +1,161 @@
+# predictor/results.py
+"""
+文件预测结果的存放、下载与清理。
+
+- 结果保存在 settings.MEDIA_ROOT/predictions/
+- 下载：整文件用 FileResponse（WSGI 服务器支持 wsgi.file_wrapper 时走 sendfile 零拷贝），
+  支持 ETag / If-None-Match、单段 Range / If-Range；
+  配置 PREDICTION_SENDFILE_HEADER（如 X-Accel-Redirect）时只返回该头，由 nginx 直接发送文件
+- 清理：删除超过 PREDICTION_MAX_AGE_HOURS 的文件，再按从旧到新删除直到总大小不超过 PREDICTION_MAX_DISK_MB；
+  刚写出的文件（PREDICTION_REAP_GRACE_SECONDS 内）和调用方指定的 keep 不会被删除
+"""
+import logging
+import os
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+
+logger = logging.getLogger(__name__)
+
+RESULT_NAME_RE = re.compile(r'^pred_[0-9a-f]{32}\.(csv|csv\.gz|csv\.zst|parquet|feather)$')
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+_reap_lock = threading.Lock()
+_last_reap = 0.0
+
+
+def prediction_dir() -> str:
+    out_dir = os.path.join(settings.MEDIA_ROOT, "predictions")
+    os.makedirs(out_dir, exist_ok=True)
+    return out_dir
+
+
+def result_path(filename: str):
+    """校验文件名（防止路径穿越），返回绝对路径；不合法时返回 None"""
+    if not RESULT_NAME_RE.match(filename):
+        return None
+    return os.path.join(prediction_dir(), filename)
+
+
+def _etag(st) -> str:
+    return f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+
+def _iter_range(path, start, length, block_size=64 * 1024):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            data = f.read(min(block_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+
+def serve_result(request, path) -> HttpResponse:
+    st = os.stat(path)
+    etag = _etag(st)
+    filename = os.path.basename(path)
+
+    if etag in [t.strip() for t in request.headers.get('If-None-Match', '').split(',')]:
+        response = HttpResponse(status=304)
+        response['ETag'] = etag
+        return response
+
+    sendfile_header = getattr(settings, 'PREDICTION_SENDFILE_HEADER', None)
+    if sendfile_header:
+        # 交给前置 nginx 发送（X-Accel-Redirect），Range/ETag 也由 nginx 处理
+        response = HttpResponse()
+        response[sendfile_header] = settings.PREDICTION_SENDFILE_PREFIX.rstrip('/') + '/' + filename
+        response['Content-Type'] = ''
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    size = st.st_size
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if range_header and (not if_range or if_range == etag):
+        m = _RANGE_RE.match(range_header.strip())
+        if m and (m.group(1) or m.group(2)):
+            if m.group(1):
+                start = int(m.group(1))
+                end = min(int(m.group(2)), size - 1) if m.group(2) else size - 1
+            else:
+                # bytes=-N：最后 N 个字节
+                start = max(0, size - int(m.group(2)))
+                end = size - 1
+            if start >= size or start > end:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+            length = end - start + 1
+            response = StreamingHttpResponse(_iter_range(path, start, length), status=206,
+                                             content_type='application/octet-stream')
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(length)
+            response['Accept-Ranges'] = 'bytes'
+            response['ETag'] = etag
+            response['Content-Disposition'] = f'attachment; filename="{filename}"'
+            return response
+
+    response = FileResponse(open(path, 'rb'), as_attachment=True, filename=filename)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    return response
+
+
+def reap(max_bytes: int = None, max_age_seconds: float = None, keep=None, grace_seconds: float = None) -> dict:
+    """按年龄和磁盘预算清理结果目录，返回删除统计；keep 中的路径和 grace_seconds 内的新文件不删除"""
+    if max_bytes is None:
+        max_bytes = int(settings.PREDICTION_MAX_DISK_MB) * 1024 * 1024
+    if max_age_seconds is None:
+        max_age_seconds = float(settings.PREDICTION_MAX_AGE_HOURS) * 3600
+    if grace_seconds is None:
+        grace_seconds = float(settings.PREDICTION_REAP_GRACE_SECONDS)
+    keep = {os.path.abspath(p) for p in ([keep] if isinstance(keep, str) else keep or [])}
+    out_dir = prediction_dir()
+    now = time.time()
+    files = []
+    for entry in os.scandir(out_dir):
+        if entry.is_file() and RESULT_NAME_RE.match(entry.name):
+            st = entry.stat()
+            files.append((st.st_mtime, st.st_size, entry.path))
+    files.sort()
+
+    removed = freed = 0
+    total = sum(f[1] for f in files)
+    for mtime, size, path in files:
+        if now - mtime <= max_age_seconds and total <= max_bytes:
+            break
+        if now - mtime < min(grace_seconds, max_age_seconds) or os.path.abspath(path) in keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        removed += 1
+        freed += size
+        total -= size
+    return {"removed": removed, "freed_bytes": freed, "remaining_bytes": total}
+
+
+def maybe_reap(keep=None):
+    """写出新结果后调用（keep 传刚写出的文件）：距上次清理超过 PREDICTION_REAP_INTERVAL 秒才真正执行"""
+    global _last_reap
+    interval = float(settings.PREDICTION_REAP_INTERVAL)
+    now = time.time()
+    if now - _last_reap < interval or not _reap_lock.acquire(blocking=False):
+        return
+    try:
+        _last_reap = now
+        stats = reap(keep=keep)
+        if stats["removed"]:
+            logger.info("Reaped prediction files: %s", stats)
+    except Exception:
+        logger.exception("Reap prediction files failed")
+    finally:
+        _reap_lock.release()
@@ -1,19 +1,53 @@
+import numpy as np
 from rest_framework import serializers
 from .utils import get_model_service
+from .feature_store import get_feature_store
+
+
+def _clean_static(svc, value):
+    """校验并转换来料特征，返回 (cleaned, errors)"""
+    cleaned = {}
+    errors = {}
+    missing = [c for c in svc.static_features if c not in value]
+    if missing:
+        errors['missing'] = missing
+        return cleaned, errors
+    for c in svc.static_features:
+        v = value.get(c)
+        if c in svc.num_features:
+            try:
+                cleaned[c] = float(v)
+            except Exception:
+                errors[c] = f"Expect numeric value for {c}, got {v}"
+        else:
+            cleaned[c] = '' if v is None else str(v)
+    return cleaned, errors
+
 
 class SinglePredictSerializer(serializers.Serializer):
     """
     接受一个 record: {"data": {"feature1": value1, ...}}
     - 校验 required features（基于模型 metadata）
     - 简单做类型转换：数值型 -> float，类别型 -> str
+    - 也可只传工步特征 + cell_id：{"cell_id": "...", "data": {工步特征...}}，来料特征从特征库关联
     """
+    cell_id = serializers.CharField(required=False)
     data = serializers.DictField(child=serializers.JSONField(), required=True)
+    # 可选：同时返回预测不确定性（虚拟集成）
+    uncertainty = serializers.BooleanField(required=False, default=False)
 
     def validate_data(self, value):
         svc = get_model_service()
         # svc.feature_cols 是训练时的列顺序（metadata）
         required = svc.feature_cols
         missing = [c for c in required if c not in value]
+        cell_id = self.initial_data.get('cell_id')
+        if missing and cell_id and all(c in svc.static_features for c in missing):
+            self._cell_entry = get_feature_store().get(cell_id)
+            if self._cell_entry is None:
+                raise serializers.ValidationError(f"Unknown cell_id: {cell_id}")
+            value = dict(self._cell_entry.features, **value)
+            missing = []
         if missing:
             raise serializers.ValidationError(f"Missing features: {missing}")
         # 类型转换（不改变原 dict，返回新的 dict）
@@ -32,6 +66,13 @@ class SinglePredictSerializer(serializers.Serializer):
                 cleaned[c] = '' if v is None else str(v)
         return cleaned
 
+    def validate(self, attrs):
+        # 来料特征来自特征库时，带上已预处理好的向量，推理时直接拼接
+        entry = getattr(self, '_cell_entry', None)
+        if entry is not None and entry.static_vec is not None:
+            attrs['static_vec'] = entry.static_vec
+        return attrs
+
 class BatchPredictSerializer(serializers.Serializer):
     """
     接受一个 list of records: {"data": [ {...}, {...} ]}
@@ -41,6 +82,8 @@ class BatchPredictSerializer(serializers.Serializer):
         required=True,
         allow_empty=False
     )
+    # 可选：同时返回预测不确定性（虚拟集成）
+    uncertainty = serializers.BooleanField(required=False, default=False)
 
     def validate_data(self, value):
         svc = get_model_service()
@@ -69,4 +112,81 @@ class BatchPredictSerializer(serializers.Serializer):
                 cleaned_list.append(cleaned)
         if errors:
             raise serializers.ValidationError(errors)
-        return cleaned_list
\ No newline at end of file
+        return cleaned_list
+
+
+class TrajectoryPredictSerializer(serializers.Serializer):
+    """
+    单个电芯多工步预测：
+    {"cell_id": "...", "static": {"来料...": v, ...}, "steps": [[工步序号, 电压, ...], ...]}
+    - static 只需来料特征（每个电芯一份）；省略时按 cell_id 从特征库关联
+    - steps 每行按 step_columns 顺序给出（缺省为模型 step_features 顺序）
+    - steps 整体用 NumPy 转换为 float 数组，不逐行构造 dict
+    """
+    cell_id = serializers.CharField(required=False, allow_blank=True)
+    static = serializers.DictField(child=serializers.JSONField(), required=False)
+    step_columns = serializers.ListField(child=serializers.CharField(), required=False)
+    steps = serializers.JSONField(required=True)
+
+    def validate_static(self, value):
+        cleaned, errors = _clean_static(get_model_service(), value)
+        if errors:
+            raise serializers.ValidationError(errors)
+        return cleaned
+
+    def validate(self, attrs):
+        svc = get_model_service()
+        if 'static' not in attrs:
+            cell_id = attrs.get('cell_id')
+            if not cell_id:
+                raise serializers.ValidationError({'static': "Either static or cell_id is required"})
+            entry = get_feature_store().get(cell_id)
+            if entry is None:
+                raise serializers.ValidationError({'cell_id': f"Unknown cell_id: {cell_id}"})
+            attrs['static'] = entry.features
+            attrs['static_vec'] = entry.static_vec
+        columns = attrs.get('step_columns') or svc.step_features
+        if sorted(columns) != sorted(svc.step_features):
+            raise serializers.ValidationError({'step_columns': f"Expect columns {svc.step_features}, got {columns}"})
+        try:
+            steps = np.asarray(attrs['steps'], dtype=np.float64)
+        except (TypeError, ValueError) as e:
+            raise serializers.ValidationError({'steps': f"Expect a numeric 2-D array: {e}"})
+        if steps.ndim != 2 or steps.shape[0] == 0 or steps.shape[1] != len(columns):
+            raise serializers.ValidationError(
+                {'steps': f"Expect shape (n_steps, {len(columns)}), got {steps.shape}"})
+        # 统一成模型的 step_features 列顺序
+        if columns != svc.step_features:
+            steps = steps[:, [columns.index(c) for c in svc.step_features]]
+        attrs['steps'] = steps
+        return attrs
+
+
+class CellFeatureUpsertSerializer(serializers.Serializer):
+    """
+    批量写入电芯来料特征：{"cells": [{"cell_id": "...", "features": {"来料...": v, ...}}, ...]}
+    - 只保留模型的来料特征列，其它键忽略
+    """
+    cells = serializers.ListField(
+        child=serializers.DictField(child=serializers.JSONField()),
+        required=True,
+        allow_empty=False
+    )
+
+    def validate_cells(self, value):
+        svc = get_model_service()
+        items = {}
+        errors = {}
+        for idx, rec in enumerate(value):
+            cell_id = rec.get('cell_id')
+            if not cell_id or not isinstance(cell_id, str) or len(cell_id) > 64:
+                errors[idx] = {'cell_id': f"Invalid cell_id: {cell_id}"}
+                continue
+            cleaned, rec_errors = _clean_static(svc, rec.get('features') or {})
+            if rec_errors:
+                errors[idx] = rec_errors
+            else:
+                items[cell_id] = cleaned
+        if errors:
+            raise serializers.ValidationError(errors)
+        return items
@@ -0,0 +1,175 @@
+# predictor/shadow.py
+"""
+候选模型的影子（shadow）评估与金丝雀（canary）分流。
+
+配置（环境变量）：
+- CANDIDATE_MODEL_VERSION：候选模型版本（MODEL_DIR/versions/<version>），为空则全部关闭
+- SHADOW_SAMPLE_RATE：0~1，按比例把主模型已处理的请求再交给候选模型打分（不在请求路径上）
+- SHADOW_WORKERS / SHADOW_MAX_PENDING：影子评估线程数与最大排队数，队列满时直接丢弃
+- SHADOW_STORE_SIZE：最近多少条 (主模型, 候选模型) 预测对保留在内存里
+- CANARY_PERCENT：0~100，按比例直接由候选模型响应请求
+
+请求线程只做一次非阻塞提交（记录提交耗时），候选模型推理在独立线程池中完成。
+"""
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .stats import RunningStats
+from .utils import ModelService, get_model_service
+
+logger = logging.getLogger(__name__)
+
+
+class PairStore:
+    """固定容量的环形缓冲区（单个 numpy 数组），保存 (时间戳, 主模型预测, 候选模型预测)"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._buf = np.zeros((capacity, 3), dtype=np.float64)
+        self._pos = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def extend(self, primary, candidate):
+        n = len(primary)
+        if n == 0 or self.capacity == 0:
+            return
+        rows = np.column_stack([np.full(n, time.time()), primary, candidate])[-self.capacity:]
+        with self._lock:
+            idx = (self._pos + np.arange(len(rows))) % self.capacity
+            self._buf[idx] = rows
+            self._pos = (self._pos + len(rows)) % self.capacity
+            self._size = min(self.capacity, self._size + len(rows))
+
+    def recent(self, limit: int):
+        with self._lock:
+            limit = min(limit, self._size)
+            idx = (self._pos - limit + np.arange(limit)) % self.capacity
+            rows = self._buf[idx].copy()
+        return [{"ts": float(r[0]), "primary": float(r[1]), "candidate": float(r[2])} for r in rows]
+
+
+class ShadowEvaluator:
+    def __init__(self):
+        self.candidate_version = os.environ.get("CANDIDATE_MODEL_VERSION") or None
+        self.sample_rate = float(os.environ.get("SHADOW_SAMPLE_RATE", 0))
+        self.canary_percent = float(os.environ.get("CANARY_PERCENT", 0))
+        workers = int(os.environ.get("SHADOW_WORKERS", 1))
+        self.max_pending = int(os.environ.get("SHADOW_MAX_PENDING", 64))
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='shadow')
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._candidate = None
+        self._candidate_error = None
+        self._load_lock = threading.Lock()
+
+        self.pairs = PairStore(int(os.environ.get("SHADOW_STORE_SIZE", 10000)))
+        self.diff_stats = RunningStats()       # 候选 - 主模型
+        self.abs_diff_stats = RunningStats()   # |候选 - 主模型|
+        self.submit_overhead = RunningStats()  # 请求线程上的提交耗时（秒）
+        self.submitted = 0
+        self.dropped = 0
+        self.failed = 0
+        self.canary_served = 0
+
+    @property
+    def enabled(self):
+        return self.candidate_version is not None and self._candidate_error is None
+
+    def candidate(self):
+        """候选模型懒加载；加载失败后不再重试，避免每个请求都卡在加载上"""
+        if self._candidate is None and self.enabled:
+            with self._load_lock:
+                if self._candidate is None and self._candidate_error is None:
+                    try:
+                        self._candidate = ModelService(version=self.candidate_version)
+                    except Exception as e:
+                        logger.exception("Shadow: candidate model %s failed to load", self.candidate_version)
+                        self._candidate_error = str(e)
+        return self._candidate
+
+    def choose_service(self):
+        """金丝雀分流：返回 (svc, is_canary)"""
+        if self.canary_percent > 0 and self.enabled and random.random() * 100 < self.canary_percent:
+            svc = self.candidate()
+            if svc is not None:
+                self.canary_served += 1
+                return svc, True
+        return get_model_service(), False
+
+    def maybe_submit(self, records, primary_preds):
+        """
+        按 SHADOW_SAMPLE_RATE 抽样，把 (原始输入, 主模型预测) 交给后台线程，不阻塞请求。
+        records: list of dict（已校验的原始特征）
+        """
+        if self.sample_rate <= 0 or not self.enabled or random.random() >= self.sample_rate:
+            return False
+        t0 = time.perf_counter()
+        if not self._slots.acquire(blocking=False):
+            self.dropped += 1
+            return False
+        self.submitted += 1
+        self._executor.submit(self._run, records, np.asarray(primary_preds, dtype=np.float64))
+        self.submit_overhead.update([time.perf_counter() - t0])
+        return True
+
+    def _run(self, records, primary_preds):
+        try:
+            svc = self.candidate()
+            if svc is None:
+                return
+            cand = np.asarray(svc.predict(pd.DataFrame(records, columns=svc.feature_cols)), dtype=np.float64)
+            diff = cand - primary_preds
+            self.diff_stats.update(diff)
+            self.abs_diff_stats.update(np.abs(diff))
+            self.pairs.extend(primary_preds, cand)
+        except Exception:
+            self.failed += 1
+            logger.exception("Shadow: candidate predict failed")
+        finally:
+            self._slots.release()
+
+    @property
+    def pending(self) -> int:
+        """已提交、尚未完成的影子预测数"""
+        return self.max_pending - self._slots._value
+
+    def summary(self, recent: int = 0):
+        overhead = self.submit_overhead.summary()
+        info = {
+            "candidate_version": self.candidate_version,
+            "candidate_error": self._candidate_error,
+            "sample_rate": self.sample_rate,
+            "canary_percent": self.canary_percent,
+            "submitted": self.submitted,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "canary_served": self.canary_served,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "diff": self.diff_stats.summary(),
+            "abs_diff": self.abs_diff_stats.summary(),
+            "submit_overhead_us": {k: (v * 1e6 if isinstance(v, float) else v) for k, v in overhead.items()},
+        }
+        if recent:
+            info["recent"] = self.pairs.recent(recent)
+        return info
+
+
+_shadow = None
+_shadow_lock = threading.Lock()
+
+
+def get_shadow():
+    global _shadow
+    if _shadow is None:
+        with _shadow_lock:
+            if _shadow is None:
+                _shadow = ShadowEvaluator()
+    return _shadow
@@ -0,0 +1,136 @@
+# predictor/stats.py
+"""
+流式统计工具：按批向量化更新，内存与样本量无关。
+"""
+import threading
+
+import numpy as np
+
+
+class RunningStats:
+    """
+    多列 Welford 均值/方差，按批合并（Chan 并行合并公式），一次更新处理整批样本。
+    update() 输入 shape (n,) 或 (n, n_cols) 的数组，NaN 按列忽略。
+    """
+
+    def __init__(self, n_cols: int = 1):
+        self.n_cols = n_cols
+        self.count = np.zeros(n_cols)
+        self.mean = np.zeros(n_cols)
+        self.m2 = np.zeros(n_cols)
+        self.min = np.full(n_cols, np.inf)
+        self.max = np.full(n_cols, -np.inf)
+        self._lock = threading.Lock()
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).reshape(-1, self.n_cols)
+        valid = ~np.isnan(values)
+        n_b = valid.sum(axis=0).astype(np.float64)
+        if not n_b.any():
+            return
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_b = np.where(n_b > 0, np.nansum(values, axis=0) / n_b, 0.0)
+            m2_b = np.nansum((values - mean_b) ** 2, axis=0)
+            min_b = np.where(n_b > 0, np.nanmin(np.where(valid, values, np.inf), axis=0), np.inf)
+            max_b = np.where(n_b > 0, np.nanmax(np.where(valid, values, -np.inf), axis=0), -np.inf)
+        with self._lock:
+            n_a = self.count
+            n = n_a + n_b
+            delta = mean_b - self.mean
+            safe_n = np.where(n > 0, n, 1)
+            self.mean = self.mean + delta * n_b / safe_n
+            self.m2 = self.m2 + m2_b + delta ** 2 * n_a * n_b / safe_n
+            self.count = n
+            self.min = np.minimum(self.min, min_b)
+            self.max = np.maximum(self.max, max_b)
+
+    @property
+    def var(self):
+        return np.where(self.count > 1, self.m2 / np.where(self.count > 1, self.count - 1, 1), np.nan)
+
+    def summary(self, names=None):
+        """返回可 JSON 序列化的统计结果（单列时直接返回 dict，多列时按 names 返回）"""
+        with self._lock:
+            rows = []
+            std = np.sqrt(self.var)
+            for i in range(self.n_cols):
+                n = int(self.count[i])
+                rows.append({
+                    "count": n,
+                    "mean": float(self.mean[i]) if n else None,
+                    "std": float(std[i]) if n > 1 else None,
+                    "min": float(self.min[i]) if n else None,
+                    "max": float(self.max[i]) if n else None,
+                })
+        if names is None:
+            return rows[0] if self.n_cols == 1 else rows
+        return dict(zip(names, rows))
+
+
+# 单次分箱最多处理的行数，限制 (行 × 特征 × 分箱) 临时数组的大小
+MAX_ROWS_PER_PASS = 10000
+
+
+def quantile_edges(values, bins: int = 10):
+    """
+    按训练数据分位数生成分箱边界。values: (n, n_cols)；返回 (n_cols, bins - 1) 的内部边界。
+    取值集中时边界可能重复，对应空箱，不影响 PSI 计算。
+    逐列计算，保留输入的浮点精度（float32 不升为 float64），临时内存只有一列大小。
+    """
+    values = np.asarray(values)
+    if not np.issubdtype(values.dtype, np.floating):
+        values = values.astype(np.float64)
+    qs = np.linspace(0, 1, bins + 1)[1:-1]
+    edges = np.full((values.shape[1], len(qs)), np.nan)
+    for i in range(values.shape[1]):
+        col = values[:, i]
+        col = col[~np.isnan(col)]
+        if len(col):
+            edges[i] = np.quantile(col, qs)
+    return edges
+
+
+def bin_counts(values, edges):
+    """
+    向量化分箱计数：第 k 箱为 edges[k-1] < v <= edges[k]（两端开放）。
+    values: (n, n_cols)，edges: (n_cols, bins - 1)。返回 (counts (n_cols, bins), 每列 NaN 数)。
+    每次最多处理 MAX_ROWS_PER_PASS 行，限制 (行 × 特征 × 分箱) 临时数组的大小。
+    """
+    values = np.asarray(values)
+    edges = np.asarray(edges, dtype=np.float64)
+    n_cols, n_edges = edges.shape
+    bins = n_edges + 1
+    offsets = np.arange(n_cols) * bins
+    counts = np.zeros(n_cols * bins, dtype=np.int64)
+    missing = np.zeros(n_cols, dtype=np.int64)
+    for start in range(0, len(values), MAX_ROWS_PER_PASS):
+        chunk = np.asarray(values[start:start + MAX_ROWS_PER_PASS], dtype=np.float64)
+        valid = ~np.isnan(chunk)
+        idx = (chunk[:, :, None] > edges[None, :, :]).sum(axis=2)
+        counts += np.bincount((idx + offsets)[valid], minlength=n_cols * bins)
+        missing += (~valid).sum(axis=0)
+    return counts.reshape(n_cols, bins), missing
+
+
+def psi(counts, expected, eps: float = 1e-4):
+    """
+    Population Stability Index，逐列计算。counts: (n_cols, bins) 实际计数；expected: (n_cols, bins) 参考占比。
+    没有样本的列返回 NaN。
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    totals = counts.sum(axis=1, keepdims=True)
+    actual = np.maximum(counts / np.where(totals > 0, totals, 1), eps)
+    expected = np.maximum(np.asarray(expected, dtype=np.float64), eps)
+    value = ((actual - expected) * np.log(actual / expected)).sum(axis=1)
+    return np.where(totals[:, 0] > 0, value, np.nan)
+
+
+def reference_histogram(values, bins: int = 10):
+    """训练分布的参考直方图：返回 (edges, expected)，可直接写入 metadata.json"""
+    values = np.asarray(values)
+    if values.ndim == 1:
+        values = values[:, None]
+    edges = quantile_edges(values, bins)
+    counts, _ = bin_counts(values, edges)
+    expected = counts / np.maximum(counts.sum(axis=1, keepdims=True), 1)
+    return edges, expected
@@ -3,9 +3,23 @@ from django.test import TestCase
 from rest_framework.test import APIClient
 from rest_framework import status
 import io
+import os
+import tempfile
 import pandas as pd
+from django.core.management import call_command
+
+# 各用例共用的一条完整特征（与 benchmarks/common.SAMPLE_ROW 相同）
+SAMPLE_ROW = {"工步序号": 1, "电压": 3.2197, "电阻": 0.382, "负短电压": 2, "K值": 0, "来料分容标识": 2,
+              "来料化成容量": 0, "来料电芯K值": 0.75562, "来料内阻4": 0.411, "来料V2壳压": 2.27123,
+              "来料V3壳压": 2.3065, "来料电芯厚度": 40.197, "来料V2电压": 3.24784, "来料V3电压": 3.2424,
+              "来料电芯电压5": 3.2197, "来料电芯重量": 1111.7, "来料电容数据": 55891,
+              "来料二注保液量": 204.65, "来料Dcir": 1.652, "来料V2内阻": 0.399, "累计时间_秒": 1}
+
 
 class PredictorAPITest(TestCase):
+    # 视图会写 logger 库（LogRecord），就绪探针也检查所有数据库
+    databases = {"default", "logger_db"}
+
     def setUp(self):
         """初始化测试客户端"""
         self.client = APIClient()
@@ -17,6 +31,31 @@ class PredictorAPITest(TestCase):
         self.assertIn("status", response.json())
         self.assertEqual(response.json()["status"], "ok")
 
+    def test_health_live_ready(self):
+        """测试存活 / 就绪探针"""
+        live = self.client.get("/api/health/live/")
+        self.assertEqual(live.status_code, status.HTTP_200_OK)
+        self.assertEqual(live.json()["status"], "alive")
+
+        ready = self.client.get("/api/health/ready/")
+        self.assertEqual(ready.status_code, status.HTTP_200_OK)
+        body = ready.json()
+        self.assertEqual(body["status"], "ready")
+        self.assertTrue(body["checks"]["model"]["warmed"])
+        self.assertIsNone(body["checks"]["model"]["retry_in_seconds"])
+        self.assertEqual(body["checks"]["db"], {"default": "ok", "logger_db": "ok"})
+
+        # 加载失败后进入退避期：退避期内的探针不再触发加载
+        from unittest import mock
+        from predictor.health import Readiness
+        readiness = Readiness()
+        with mock.patch("predictor.health.get_model_service", side_effect=RuntimeError("boom")) as load:
+            readiness.load_and_warm()
+            readiness.ensure_loading()
+            self.assertEqual(load.call_count, 1)
+        self.assertEqual(readiness.failed_attempts, 1)
+        self.assertGreater(readiness.retry_in_seconds(), 0)
+
     def test_single_predict(self):
         """测试单条预测 /api/predict/"""
         payload = {
@@ -71,6 +110,269 @@ class PredictorAPITest(TestCase):
             self.assertEqual(len(response.json()["predictions"]), 2)
             result = response.json()
             print(result)
+
+            # 重复的批量请求命中结果缓存，预测值不变
+            from predictor.result_cache import get_result_cache
+            hits = get_result_cache().summary()["hits"]
+            again = self.client.post("/api/predict/batch/", payload, format="json").json()
+            self.assertGreaterEqual(get_result_cache().summary()["hits"], hits + 2)
+            self.assertEqual([r["prediction"] for r in again["predictions"]],
+                             [r["prediction"] for r in result["predictions"]])
+
+    def test_trajectory_predict(self):
+        """测试单电芯多工步预测 /api/predict/trajectory/"""
+        payload = {
+            "cell_id": "03HPB0BT0001EYF7S0000035",
+            "static": {
+                "来料分容标识": 2, "来料化成容量": 0, "来料电芯K值": 0.75562, "来料内阻4": 0.411,
+                "来料V2壳压": 2.27123, "来料V3壳压": 2.3065, "来料电芯厚度": 40.197, "来料V2电压": 3.24784,
+                "来料V3电压": 3.2424, "来料电芯电压5": 3.2197, "来料电芯重量": 1111.7,
+                "来料电容数据": 55891, "来料二注保液量": 204.65, "来料Dcir": 1.652, "来料V2内阻": 0.399
+            },
+            "step_columns": ["工步序号", "电压", "电阻", "负短电压", "K值", "累计时间_秒"],
+            "steps": [
+                [1, 3.2197, 0.382, 2, 0, 1],
+                [2, 3.2250, 0.380, 2, 0, 61],
+                [3, 3.2301, 0.379, 2, 0, 121],
+            ]
+        }
+        response = self.client.post("/api/predict/trajectory/", payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        result = response.json()
+        self.assertEqual(result["count"], 3)
+        self.assertEqual(len(result["predictions"]), 3)
+
+        # 与逐行 batch 接口结果一致
+        static = payload["static"]
+        rows = [dict(static, **dict(zip(payload["step_columns"], step))) for step in payload["steps"]]
+        batch = self.client.post("/api/predict/batch/", {"data": rows}, format="json").json()
+        for got, expect in zip(result["predictions"], batch["predictions"]):
+            self.assertAlmostEqual(got, expect["prediction"], places=6)
+
+    def test_cell_feature_predict(self):
+        """测试来料特征库 /api/features/cells/ + 按 cell_id 预测"""
+        static = {
+            "来料分容标识": 2, "来料化成容量": 0, "来料电芯K值": 0.75562, "来料内阻4": 0.411,
+            "来料V2壳压": 2.27123, "来料V3壳压": 2.3065, "来料电芯厚度": 40.197, "来料V2电压": 3.24784,
+            "来料V3电压": 3.2424, "来料电芯电压5": 3.2197, "来料电芯重量": 1111.7,
+            "来料电容数据": 55891, "来料二注保液量": 204.65, "来料Dcir": 1.652, "来料V2内阻": 0.399
+        }
+        step = {"工步序号": 1, "电压": 3.2197, "电阻": 0.382, "负短电压": 2, "K值": 0, "累计时间_秒": 1}
+        response = self.client.post("/api/features/cells/",
+                                    {"cells": [{"cell_id": "CELL-001", "features": static}]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["count"], 1)
+
+        response = self.client.get("/api/features/cells/CELL-001/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["features"]["来料Dcir"], 1.652)
+        self.assertEqual(self.client.get("/api/features/cells/UNKNOWN/").status_code, status.HTTP_404_NOT_FOUND)
+
+        by_cell = self.client.post("/api/predict/", {"cell_id": "CELL-001", "data": step}, format="json")
+        self.assertEqual(by_cell.status_code, status.HTTP_200_OK)
+        full = self.client.post("/api/predict/", {"data": dict(static, **step)}, format="json")
+        self.assertAlmostEqual(by_cell.json()["prediction"], full.json()["prediction"], places=6)
+
+        # 其它 worker 直接改库：缓存过期后按 updated_at 发现变化并重新加载
+        from django.utils import timezone
+        from .feature_store import get_feature_store
+        from .models import CellFeature
+        store = get_feature_store()
+        revalidate_seconds, store.revalidate_seconds = store.revalidate_seconds, 0
+        try:
+            CellFeature.objects.filter(cell_id="CELL-001").update(features=dict(static, 来料Dcir=2.0),
+                                                                 updated_at=timezone.now())
+            self.assertEqual(store.get("CELL-001").features["来料Dcir"], 2.0)
+        finally:
+            store.revalidate_seconds = revalidate_seconds
+
+    def test_shadow_evaluation(self):
+        """测试影子评估：候选模型与主模型相同时差值为 0，/api/shadow/ 返回统计"""
+        from predictor.shadow import ShadowEvaluator
+        from predictor.utils import get_model_service
+        svc = get_model_service()
+        shadow = ShadowEvaluator()
+        shadow.candidate_version = "self"
+        shadow._candidate = svc
+        shadow.sample_rate = 1.0
+        records = [SAMPLE_ROW] * 4
+        preds = svc.predict(pd.DataFrame(records, columns=svc.feature_cols))
+        self.assertTrue(shadow.maybe_submit(records, preds))
+        shadow._executor.shutdown(wait=True)
+        summary = shadow.summary(recent=10)
+        self.assertEqual(summary["diff"]["count"], 4)
+        self.assertAlmostEqual(summary["abs_diff"]["max"], 0.0)
+        self.assertEqual(len(summary["recent"]), 4)
+
+        response = self.client.get("/api/shadow/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("submitted", response.json())
+
+    def test_drift_report(self):
+        """测试漂移监控 /api/drift/：批量预测后统计更新"""
+        self.client.delete("/api/drift/")
+        self.client.post("/api/predict/batch/", {"data": [SAMPLE_ROW] * 5}, format="json")
+        response = self.client.get("/api/drift/?histograms=1")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        voltage = response.json()["features"]["电压"]
+        self.assertEqual(voltage["count"], 5)
+        self.assertAlmostEqual(voltage["mean"], 3.2197)
+        self.assertEqual(sum(voltage["counts"]), 5)
+        self.assertIsNotNone(voltage["psi"])
+        self.assertEqual(response.json()["prediction"]["count"], 5)
+
+        # 参考直方图分块计数，结果与行数无关地一致；float32 输入不升精度
+        import numpy as np
+        from .stats import MAX_ROWS_PER_PASS, reference_histogram
+        values = np.random.RandomState(0).normal(size=(MAX_ROWS_PER_PASS * 2 + 7, 3)).astype(np.float32)
+        values[::11, 1] = np.nan
+        edges, expected = reference_histogram(values, 10)
+        self.assertEqual(edges.shape, (3, 9))
+        np.testing.assert_allclose(expected.sum(axis=1), 1.0)
+        np.testing.assert_allclose(expected[0], 0.1, atol=0.01)
+
+    def test_admission_shedding(self):
+        """测试准入控制：batch 名额用尽时返回 429 + Retry-After，单条预测不受影响"""
+        from predictor.admission import get_admission
+        controller = get_admission()
+        old_limit = controller.limits['batch']
+        controller.limits['batch'] = 0
+        try:
+            response = self.client.post("/api/predict/batch/", {"data": [{"工步序号": 1}]}, format="json")
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertIn("Retry-After", response)
+            self.assertEqual(response.json()["error"], "overloaded")
+        finally:
+            controller.limits['batch'] = old_limit
+        health = self.client.get("/api/health/").json()
+        self.assertGreaterEqual(health["admission"]["shed"]["batch"], 1)
+        self.assertEqual(health["admission"]["inflight"]["batch"], 0)
+
+        # 处理函数抛出未处理的异常（DRF 不调用 finalize_response）时名额仍会归还
+        from rest_framework.test import APIRequestFactory
+        from predictor.admission import AdmissionControlledView
+
+        class Failing(AdmissionControlledView):
+            permission_classes = []
+            admission_class = 'batch'
+
+            def post(self, request):
+                raise RuntimeError("model load failed")
+
+        view = Failing.as_view()
+        for _ in range(controller.limits['batch'] + 1):
+            with self.assertRaises(RuntimeError):
+                view(APIRequestFactory().post("/x/", {"data": []}, format="json"))
+        self.assertEqual(controller.summary()["inflight"]["batch"], 0)
+        self.assertEqual(controller.summary()["rows_in_flight"], 0)
+
+    def test_idempotency_key(self):
+        """测试 Idempotency-Key：重试返回首次响应且不重复写 PredictionRecord，换请求体返回 422"""
+        from predictor.models import PredictionRecord
+        payload = {"data": SAMPLE_ROW}
+        first = self.client.post("/api/predict/", payload, format="json", HTTP_IDEMPOTENCY_KEY="retry-001")
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        count = PredictionRecord.objects.count()
+
+        retry = self.client.post("/api/predict/", payload, format="json", HTTP_IDEMPOTENCY_KEY="retry-001")
+        self.assertEqual(retry.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(PredictionRecord.objects.count(), count)
+
+        payload["data"]["电压"] = 3.3
+        reused = self.client.post("/api/predict/", payload, format="json", HTTP_IDEMPOTENCY_KEY="retry-001")
+        self.assertEqual(reused.status_code, 422)
+
+    def test_explain(self):
+        """测试 SHAP 解释 /api/explain/：贡献之和等于预测值，top_k 截断，结果与单条预测一致"""
+        response = self.client.post("/api/explain/", {"data": [SAMPLE_ROW, SAMPLE_ROW]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        result = response.json()
+        self.assertEqual(result["count"], 2)
+        first = result["explanations"][0]
+        self.assertEqual(len(first["contributions"]), len(SAMPLE_ROW))
+        total = result["expected_value"] + sum(c["shap"] for c in first["contributions"])
+        self.assertAlmostEqual(total, first["prediction"], places=5)
+
+        single = self.client.post("/api/predict/", {"data": SAMPLE_ROW}, format="json").json()
+        self.assertAlmostEqual(single["prediction"], first["prediction"], places=5)
+
+        top = self.client.post("/api/explain/", {"data": SAMPLE_ROW, "top_k": 3}, format="json").json()
+        shaps = [abs(c["shap"]) for c in top["explanations"][0]["contributions"]]
+        self.assertEqual(len(shaps), 3)
+        self.assertEqual(shaps, sorted(shaps, reverse=True))
+
+    def test_predict_uncertainty(self):
+        """测试可选的不确定性输出：RMSE 模型只有模型不确定性，MultiQuantile 模型返回预测区间"""
+        single = self.client.post("/api/predict/", {"data": SAMPLE_ROW, "uncertainty": True}, format="json").json()
+        unc = single["uncertainty"]
+        self.assertGreaterEqual(unc["model_std"], 0)
+        self.assertEqual(unc["type"], "epistemic")
+        self.assertNotIn("lower", unc)
+        # 命中结果缓存时同样返回
+        again = self.client.post("/api/predict/", {"data": SAMPLE_ROW, "uncertainty": True}, format="json").json()
+        self.assertAlmostEqual(again["uncertainty"]["model_std"], unc["model_std"])
+
+        batch = self.client.post("/api/predict/batch/", {"data": [SAMPLE_ROW, SAMPLE_ROW], "uncertainty": True},
+                                 format="json").json()
+        self.assertIn("prediction_model_std", batch["predictions"][0])
+        self.assertEqual(batch["uncertainty_type"], "epistemic")
+        plain = self.client.post("/api/predict/batch/", {"data": [SAMPLE_ROW]}, format="json").json()
+        self.assertNotIn("prediction_model_std", plain["predictions"][0])
+
+        # MultiQuantile 模型：一次预测同时得到点预测（中位数）与预测区间
+        import copy
+        import numpy as np
+        from catboost import CatBoostRegressor
+        from predictor.utils import get_model_service
+        svc = copy.copy(get_model_service())
+        df = pd.DataFrame([SAMPLE_ROW] * 50, columns=svc.feature_cols)
+        df["电压"] = np.linspace(3.0, 3.5, 50)
+        y = 3.2 + np.random.RandomState(0).normal(0, 0.01, 50)
+        svc.model = CatBoostRegressor(iterations=20, loss_function="MultiQuantile:alpha=0.1,0.5,0.9", verbose=0)
+        svc.model.fit(svc.preprocess(df), y)
+        svc.loss, svc.quantiles, svc._point_idx = "MultiQuantile", [0.1, 0.5, 0.9], 1
+        preds, unc = svc.predict_with_uncertainty(df)
+        self.assertEqual(unc["type"], "quantile")
+        self.assertEqual(unc["alpha"], [0.1, 0.9])
+        self.assertTrue(np.all(unc["values"]["lower"] <= preds) and np.all(preds <= unc["values"]["upper"]))
+        self.assertEqual(svc.predict(df).shape, (50,))
+
+    def test_profiling_admin(self):
+        """测试剖析开关：仅管理员可用，开启后采样请求并可下载剖析结果；并发采样不影响请求"""
+        from django.contrib.auth.models import User
+        from .profiling import get_profiler
+        self.assertEqual(self.client.get("/api/admin/profiling/").status_code, status.HTTP_403_FORBIDDEN)
+
+        admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.client.force_authenticate(admin)
+        profiler = get_profiler()
+        out_dir = profiler.out_dir
+        with tempfile.TemporaryDirectory() as tmp:
+            profiler.out_dir = tmp
+            resp = self.client.post("/api/admin/profiling/", {"enabled": True, "mode": "cprofile", "sample_rate": 1.0},
+                                    format="json")
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            try:
+                ok = self.client.post("/api/predict/batch/", {"data": [SAMPLE_ROW] * 200}, format="json")
+                self.assertEqual(ok.status_code, status.HTTP_200_OK)
+                summary = self.client.get("/api/admin/profiling/").json()
+                self.assertEqual(summary["sampled"].get("PredictBatch"), 1)
+                out = self.client.get("/api/admin/profiling/PredictBatch/")
+                self.assertEqual(out.status_code, status.HTTP_200_OK)
+                self.assertGreater(len(b"".join(out.streaming_content)), 0)
+
+                # 已有 cProfile 会话时，被抽中的请求不剖析而不是报错
+                with profiler._cprofile_lock:
+                    busy = self.client.post("/api/predict/batch/", {"data": [SAMPLE_ROW]}, format="json")
+                self.assertEqual(busy.status_code, status.HTTP_200_OK)
+                self.assertEqual(self.client.get("/api/admin/profiling/").json()["sampled"]["PredictBatch"], 1)
+            finally:
+                self.client.post("/api/admin/profiling/", {"enabled": False, "mode": "stack"}, format="json")
+                profiler.reset()
+                profiler.out_dir = out_dir
+
     def test_file_predict(self):
         """测试文件上传预测 /api/predict/file/"""
         # 构造一个 CSV 文件（内存中生成）
@@ -90,3 +392,126 @@ class PredictorAPITest(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn("predictions", response.json())
         self.assertEqual(len(response.json()["predictions"]), 2)
+
+    def test_file_predict_formats(self):
+        """测试 Parquet / gzip CSV 上传，结果按同格式输出"""
+        row = dict(SAMPLE_ROW, 电芯条码="CELL-001")
+        df = pd.DataFrame([row] * 3)
+
+        buf = io.BytesIO()
+        df.to_parquet(buf, index=False)
+        buf.seek(0)
+        buf.name = "input.parquet"
+        response = self.client.post("/api/predict/file/", {"file": buf, "columns": "电芯条码"}, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["input_format"], "parquet")
+        self.assertTrue(response.json()["file_name"].endswith(".parquet"))
+        self.assertEqual(response.json()["rows"], 3)
+
+        buf = io.BytesIO()
+        df.to_csv(buf, index=False, compression="gzip")
+        buf.seek(0)
+        buf.name = "input.csv.gz"
+        response = self.client.post("/api/predict/file/", {"file": buf, "output_format": "csv"}, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["input_format"], "csv.gz")
+        self.assertTrue(response.json()["file_name"].endswith(".csv"))
+
+    def test_file_result_download(self):
+        """测试结果文件下载：默认 gzip 写盘、整文件下载、ETag 304、Range 206、非法文件名 404"""
+        csv_buf = io.StringIO()
+        pd.DataFrame([SAMPLE_ROW] * 3).to_csv(csv_buf, index=False)
+        csv_buf.seek(0)
+        result = self.client.post("/api/predict/file/", {"file": csv_buf}, format="multipart").json()
+        self.assertTrue(result["file_name"].endswith(".csv.gz"))
+        url = f"/api/predict/file/{result['file_name']}/"
+
+        full = self.client.get(url)
+        self.assertEqual(full.status_code, status.HTTP_200_OK)
+        body = b"".join(full.streaming_content)
+        df_out = pd.read_csv(io.BytesIO(body), compression="gzip")
+        self.assertEqual(len(df_out), 3)
+
+        cached = self.client.get(url, HTTP_IF_NONE_MATCH=full["ETag"])
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        part = self.client.get(url, HTTP_RANGE="bytes=0-9")
+        self.assertEqual(part.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b"".join(part.streaming_content), body[:10])
+        self.assertEqual(part["Content-Range"], f"bytes 0-9/{len(body)}")
+
+        # 超出磁盘预算时，刚写出的文件（宽限期内 / keep）不会被清理
+        from .results import reap, result_path
+        path = result_path(result["file_name"])
+        reap(max_bytes=0)
+        self.assertTrue(os.path.exists(path))
+        reap(max_bytes=0, keep=path, grace_seconds=0)
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.client.get("/api/predict/file/..%2Fdb.sqlite3/").status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+    def test_predict_bulk_command(self):
+        """测试离线批量打分命令 predict_bulk（含断点续跑）"""
+        row = dict(SAMPLE_ROW, 电芯条码="CELL-001")
+        with tempfile.TemporaryDirectory() as tmp:
+            src_dir = os.path.join(tmp, "pack")
+            os.makedirs(src_dir)
+            pd.DataFrame([row] * 25).to_csv(os.path.join(src_dir, "pack1.csv"), index=False)
+            out_dir = os.path.join(tmp, "out")
+            call_command("predict_bulk", src_dir, output_dir=out_dir, format="csv", chunk_size=10,
+                         keep_columns="电芯条码", stdout=io.StringIO())
+            file_dir = os.path.join(out_dir, next(d for d in os.listdir(out_dir) if d.startswith("pack1.csv-")))
+            parts = sorted(p for p in os.listdir(file_dir) if p.startswith("part-"))
+            self.assertEqual(len(parts), 3)
+            df_out = pd.concat(pd.read_csv(os.path.join(file_dir, p)) for p in parts)
+            self.assertEqual(len(df_out), 25)
+            self.assertEqual(list(df_out.columns), ["电芯条码", "prediction"])
+
+            out = io.StringIO()
+            call_command("predict_bulk", src_dir, output_dir=out_dir, format="csv", chunk_size=10,
+                         keep_columns="电芯条码", stdout=out)
+            self.assertIn("already done", out.getvalue())
+
+            # 不同目录下的同名文件输出到不同子目录；--restart 可清掉含子目录的输出
+            other_dir = os.path.join(tmp, "pack2")
+            os.makedirs(other_dir)
+            pd.DataFrame([row] * 5).to_csv(os.path.join(other_dir, "pack1.csv"), index=False)
+            os.makedirs(os.path.join(file_dir, "stale"))
+            call_command("predict_bulk", src_dir, other_dir, output_dir=out_dir, format="csv", chunk_size=10,
+                         keep_columns="电芯条码", restart=True, stdout=io.StringIO())
+            self.assertEqual(len([d for d in os.listdir(out_dir) if d.startswith("pack1.csv-")]), 2)
+            self.assertFalse(os.path.exists(os.path.join(file_dir, "stale")))
+
+            # --keep-columns 指定的列不存在时直接报错
+            from django.core.management.base import CommandError
+            with self.assertRaises(CommandError):
+                call_command("predict_bulk", src_dir, output_dir=os.path.join(tmp, "out2"), format="csv",
+                             keep_columns="不存在的列", stdout=io.StringIO())
+
+    def test_evaluate_models_command(self):
+        """测试模型评估命令 evaluate_models：按工步输出 RMSE / MAE 与推理开销"""
+        import json
+        rows = [dict(SAMPLE_ROW, 电芯条码=f"HOLDOUT-{i % 3}", 工步序号=1 + i % 2, 单体电压=3.2 + 0.001 * i)
+                for i in range(20)]
+        with tempfile.TemporaryDirectory() as tmp:
+            dataset = os.path.join(tmp, "dataset_test.parquet")
+            pd.DataFrame(rows).to_parquet(dataset, index=False)
+            output = os.path.join(tmp, "report.json")
+            call_command("evaluate_models", dataset=dataset, output=output, workers=1, stdout=io.StringIO())
+            with open(output, "r", encoding="utf-8") as f:
+                report = json.load(f)
+            self.assertEqual(report["held_out_cells"], 3)
+            for result in report["versions"].values():
+                self.assertEqual(result["overall"]["rows"], 20)
+                self.assertEqual(set(result["per_step"]), {"1", "2"})
+                self.assertGreater(result["rows_per_sec"], 0)
+
+        # 工步序号缺失的行不会让 bincount 出错，单独归到 missing
+        import numpy as np
+        from predictor.management.commands.evaluate_models import _error_metrics
+        overall, per_step = _error_metrics(np.array([0.1, -0.1, 0.2]), np.array([1.0, np.nan, 1.0]))
+        self.assertEqual(overall["rows"], 3)
+        self.assertEqual(per_step["1"]["rows"], 2)
+        self.assertEqual(per_step["missing"]["rows"], 1)
@@ -1,11 +1,24 @@
 from django.urls import path
-from .views import PredictSingle, PredictBatch, PredictFile, HealthCheck
+from .views import (HealthLive, HealthReady, PredictSingle, PredictBatch, PredictTrajectory, PredictFile, HealthCheck,
+                    CellFeatureUpsert, CellFeatureDetail, ShadowReport, DriftReport, PredictFileDownload, Explain,
+                    ProfilingAdmin, ProfilingOutput)
 
 app_name = 'predictor'
 
 urlpatterns = [
     path('health/', HealthCheck.as_view(), name='health'),
+    path('health/live/', HealthLive.as_view(), name='health_live'),       # GET /api/health/live/
+    path('health/ready/', HealthReady.as_view(), name='health_ready'),    # GET /api/health/ready/
     path('predict/', PredictSingle.as_view(), name='predict_single'),      # POST /api/predict/
     path('predict/batch/', PredictBatch.as_view(), name='predict_batch'),  # POST /api/predict/batch/
+    path('predict/trajectory/', PredictTrajectory.as_view(), name='predict_trajectory'),  # POST /api/predict/trajectory/
     path('predict/file/', PredictFile.as_view(), name='predict_file'),     # POST /api/predict/file/
+    path('predict/file/<str:file_name>/', PredictFileDownload.as_view(), name='predict_file_download'),  # GET /api/predict/file/<file_name>/
+    path('features/cells/', CellFeatureUpsert.as_view(), name='cell_feature_upsert'),                  # POST /api/features/cells/
+    path('features/cells/<str:cell_id>/', CellFeatureDetail.as_view(), name='cell_feature_detail'),    # GET /api/features/cells/<cell_id>/
+    path('explain/', Explain.as_view(), name='explain'),                                                # POST /api/explain/
+    path('shadow/', ShadowReport.as_view(), name='shadow_report'),                                     # GET /api/shadow/
+    path('drift/', DriftReport.as_view(), name='drift_report'),                                         # GET/DELETE /api/drift/
+    path('admin/profiling/', ProfilingAdmin.as_view(), name='profiling_admin'),                         # GET/POST/DELETE /api/admin/profiling/
+    path('admin/profiling/<str:view_name>/', ProfilingOutput.as_view(), name='profiling_output'),      # GET /api/admin/profiling/<view_name>/
 ]
\ No newline at end of file
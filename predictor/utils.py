@@ -1,14 +1,49 @@
 import json
 import joblib
 import os
+import threading
+import numpy as np
 import pandas as pd
-from catboost import CatBoostRegressor
+from catboost import CatBoostRegressor, Pool
 from django.conf import settings
+from sklearn.impute import SimpleImputer
+from sklearn.preprocessing import StandardScaler
+
+from .profiling import profiled
+from .result_cache import row_keys
+
+
+def resolve_model_dir(version: str = None) -> str:
+    """
+    模型目录解析：
+    - 指定 version：MODEL_DIR/versions/<version>
+    - 否则若存在 MODEL_DIR/CURRENT（train_and_save.py 发布时原子更新），取其中记录的版本
+    - 都没有时退回 MODEL_DIR 本身（旧的平铺布局）
+    """
+    root = settings.MODEL_DIR
+    if version is None:
+        current = os.path.join(root, 'CURRENT')
+        if os.path.exists(current):
+            with open(current, 'r', encoding='utf-8') as f:
+                version = f.read().strip() or None
+    if version is None:
+        return root
+    return os.path.join(root, 'versions', version)
+
+
+def list_model_versions():
+    """已发布的模型版本（MODEL_DIR/versions 下的目录名，按名称排序）"""
+    versions_dir = os.path.join(settings.MODEL_DIR, 'versions')
+    if not os.path.isdir(versions_dir):
+        return []
+    return sorted(d for d in os.listdir(versions_dir)
+                  if not d.startswith('.') and os.path.exists(os.path.join(versions_dir, d, 'metadata.json')))
 
 
 class ModelService:
-    def __init__(self):
-        models_dir = settings.MODEL_DIR
+    def __init__(self, version: str = None):
+        models_dir = resolve_model_dir(version)
+        self.model_dir = models_dir
         meta_path = os.path.join(models_dir, 'metadata.json')
         with open(meta_path, 'r', encoding='utf-8') as f:
             meta = json.load(f)
@@ -18,7 +53,17 @@ class ModelService:
         self.model_version = meta.get('model_version', [])
         self.model_path = os.path.join(models_dir, os.path.basename(meta['model_path']))
         self.pipeline_path = os.path.join(models_dir, os.path.basename(meta['num_pipeline_path']))
-
+        # 来料特征（每个电芯一份，各工步相同）与工步特征（随工步变化）
+        self.static_features = meta.get('static_features') or [c for c in self.feature_cols if c.startswith('来料')]
+        self.step_features = [c for c in self.feature_cols if c not in self.static_features]
+        self._static_idx = [self.feature_cols.index(c) for c in self.static_features]
+        self._step_idx = [self.feature_cols.index(c) for c in self.step_features]
+        # 训练分布参考直方图（漂移监控用，旧模型没有）
+        self.drift_reference = meta.get('drift_reference')
+        # 损失函数决定不确定性的形式（旧模型没有记录，均为 RMSE）；多输出模型取点预测所在的列
+        self.loss = meta.get('loss', 'RMSE').split(':')[0]
+        self.quantiles = meta.get('quantiles')
+        self._point_idx = self.quantiles.index(0.5) if self.loss == 'MultiQuantile' else 0
 
         # load model and pipeline
         self.model = CatBoostRegressor()
@@ -28,8 +73,44 @@ class ModelService:
             self.num_pipeline = joblib.load(self.pipeline_path)
         else:
             self.num_pipeline = None
+        self._num_affine = self._build_num_affine()
+        # SHAP 基准值（所有样本相同），第一次 explain 时得到
+        self.shap_expected_value = None
+        # 模型（认知）不确定性：虚拟集成个数
+        self.uncertainty_ensembles = int(os.environ.get("UNCERTAINTY_ENSEMBLES", 10))
 
+    def _build_num_affine(self):
+        """
+        若 num_pipeline 只由 SimpleImputer / StandardScaler 组成（逐列独立变换），
+        把它展开成 (填充值, 均值, 标准差) 三个数组，之后可只对部分列做向量化变换。
+        pipeline 含其它步骤时返回 None，调用方应退回 preprocess()。
+        """
+        n = len(self.num_features)
+        fill = np.full(n, np.nan)
+        mean = np.zeros(n)
+        scale = np.ones(n)
+        if self.num_pipeline is None:
+            return fill, mean, scale
+        steps = getattr(self.num_pipeline, 'steps', None)
+        if not steps:
+            return None
+        for _, step in steps:
+            if isinstance(step, SimpleImputer):
+                if step.add_indicator or len(step.statistics_) != n:
+                    return None
+                # 填充值统一换算到原始空间
+                stats = step.statistics_.astype(float) * scale + mean
+                fill = np.where(np.isnan(fill), stats, fill)
+            elif isinstance(step, StandardScaler):
+                if step.with_mean:
+                    mean = mean + step.mean_ * scale
+                if step.with_std:
+                    scale = scale * step.scale_
+            else:
+                return None
+        return fill, mean, scale
 
+    @profiled('ModelService.preprocess')
     def preprocess(self, df: pd.DataFrame):
         missing = [c for c in self.feature_cols if c not in df.columns]
         if missing:
@@ -42,19 +123,183 @@ class ModelService:
         return df
 
 
-    def predict(self, df: pd.DataFrame):
-        X = self.preprocess(df)
-        preds = self.model.predict(X)
+    def predict(self, df: pd.DataFrame, thread_count: int = -1, cache=None):
+        """
+        thread_count：CatBoost 推理线程数，-1 为全部核心；多个调用并发时由调用方分摊核心数。
+        提供 cache（result_cache.ResultCache）时只对未命中的行预处理和推理，并回填预测值（与 explain 共用 key）。
+        """
+        if cache is None:
+            X = self.preprocess(df)
+            return self._point(self.model.predict(X, thread_count=thread_count))
+        keys = row_keys(self, df)
+        cached = cache.get_many(keys)
+        preds = np.array([np.nan if v is None else v['prediction'] for v in cached])
+        miss = [i for i, v in enumerate(cached) if v is None]
+        if miss:
+            X = self.preprocess(df.iloc[miss])
+            preds[miss] = self._point(self.model.predict(X, thread_count=thread_count))
+            cache.put_many([keys[i] for i in miss], preds[miss])
         return preds
 
+    def _point(self, raw):
+        """多输出模型（MultiQuantile / RMSEWithUncertainty）的预测取点预测所在的列：中位数 / 均值"""
+        raw = np.asarray(raw)
+        return raw[:, self._point_idx] if raw.ndim == 2 else raw
+
+    def model_std(self, X):
+        """
+        对已预处理的 X 用 CatBoost 虚拟集成（virtual ensembles）估计模型不确定性，返回各行的标准差。
+        RMSE 模型的虚拟集成只反映子集成之间的分歧（认知 / 模型不确定性），不含数据噪声，
+        不能当作某个置信水平的预测区间使用；只适合相对比较（如挑出模型把握较低的样本复检）。
+        训练时开启 posterior_sampling（train_and_save.py --posterior-sampling）估计会更可靠。
+        """
+        ens = np.asarray(self.model.virtual_ensembles_predict(
+            X, prediction_type='VirtEnsembles', virtual_ensembles_count=self.uncertainty_ensembles))
+        if ens.ndim == 3:
+            ens = ens[..., self._point_idx]
+        return ens.std(axis=1)
+
+    def predict_with_uncertainty(self, df: pd.DataFrame):
+        """
+        预测 + 不确定性，只预处理一次，不确定性由一次批量调用得到；返回 (preds, uncertainty)，
+        uncertainty = {"type": ..., "values": {名称: 各行数组}}，形式取决于训练时的损失函数（--loss）：
+        - MultiQuantile：type=quantile，values 为 lower / upper（最小 / 最大分位数，alpha 见 uncertainty["alpha"]），
+          点预测为中位数；分位数交叉时按行排序
+        - RMSEWithUncertainty：type=total，虚拟集成的 TotalUncertainty 拆成 data_std（数据噪声）与
+          model_std（模型分歧），std 为两者方差之和的平方根
+        - RMSE：type=epistemic，values 只有 model_std（见 model_std()，不是预测区间）
+        """
+        X = self.preprocess(df)
+        if self.loss == 'MultiQuantile':
+            q = np.sort(np.asarray(self.model.predict(X)).reshape(len(X), -1), axis=1)
+            return q[:, self._point_idx], {"type": "quantile", "alpha": [self.quantiles[0], self.quantiles[-1]],
+                                           "values": {"lower": q[:, 0], "upper": q[:, -1]}}
+        preds = self._point(self.model.predict(X))
+        if self.loss == 'RMSEWithUncertainty':
+            # 列依次为：均值、知识（模型）不确定性、数据不确定性，后两者为方差
+            ens = np.asarray(self.model.virtual_ensembles_predict(
+                X, prediction_type='TotalUncertainty', virtual_ensembles_count=self.uncertainty_ensembles))
+            knowledge, data = np.maximum(ens[:, 1], 0), np.maximum(ens[:, 2], 0)
+            return preds, {"type": "total", "values": {"std": np.sqrt(knowledge + data), "data_std": np.sqrt(data),
+                                                       "model_std": np.sqrt(knowledge)}}
+        return preds, {"type": "epistemic", "values": {"model_std": self.model_std(X)}}
+
+    def explain(self, df: pd.DataFrame, cache=None):
+        """
+        批量 SHAP 解释，返回 (predictions (n,), shap (n, len(feature_cols)), expected_value)。
+        未命中缓存的行一次性送入 CatBoost 计算（ShapValues 各列之和即预测值，无需再单独 predict）；
+        提供 cache（result_cache.ResultCache）时按行复用并回填，key 与预测缓存相同。
+        """
+        n = len(df)
+        preds = np.empty(n)
+        shap = np.empty((n, len(self.feature_cols)))
+        keys = row_keys(self, df) if cache is not None else None
+        cached = cache.get_many(keys) if cache is not None else [None] * n
+        miss = []
+        for i, v in enumerate(cached):
+            if v is None or v['shap'] is None:
+                miss.append(i)
+            else:
+                preds[i] = v['prediction']
+                shap[i] = v['shap']
+        if miss:
+            X = self.preprocess(df.iloc[miss])
+            values = self.model.get_feature_importance(data=Pool(X, cat_features=self.cat_features),
+                                                       type='ShapValues')
+            if values.ndim == 3:
+                # 多输出模型：(n, 输出数, 特征数 + 1)，只解释点预测
+                values = values[:, self._point_idx, :]
+            shap[miss] = values[:, :-1]
+            preds[miss] = values.sum(axis=1)
+            self.shap_expected_value = float(values[0, -1])
+            if cache is not None:
+                cache.put_many([keys[i] for i in miss], preds[miss], shap[miss])
+        return preds, shap, self.shap_expected_value
+
+    def transform_num_array(self, cols, values: np.ndarray) -> np.ndarray:
+        """
+        只对 cols 这几列（须为数值列）做与 num_pipeline 等价的变换。
+        values: shape (n, len(cols)) 的 float 数组。
+        """
+        fill, mean, scale = self._num_affine
+        idx = [self.num_features.index(c) for c in cols]
+        values = np.where(np.isnan(values), fill[idx], values)
+        return (values - mean[idx]) / scale[idx]
+
+    def preprocess_static(self, static: dict):
+        """
+        来料特征只做一次预处理，返回按 static_features 顺序的一维数组。
+        有类别列或 pipeline 不能逐列展开时返回 None。
+        """
+        if self.cat_features or self._num_affine is None:
+            return None
+        row = np.array([[static[c] for c in self.static_features]], dtype=np.float64)
+        return self.transform_num_array(self.static_features, row)[0]
+
+    def predict_trajectory(self, static: dict, steps: np.ndarray, static_vec=None):
+        """
+        单个电芯的多工步预测。
+        static: 来料特征 dict（每个电芯一份）；steps: shape (n_steps, len(step_features)) 的数组，
+        列顺序与 self.step_features 一致。来料特征只预处理一次，再用 NumPy 广播到每个工步。
+        static_vec: 已预处理好的来料特征（如来自特征库缓存），提供时跳过来料特征预处理。
+        """
+        steps = np.asarray(steps, dtype=np.float64)
+        if static_vec is None:
+            static_vec = self.preprocess_static(static)
+        if static_vec is None:
+            # 有类别列或 pipeline 不能逐列展开时，退回通用 DataFrame 路径
+            df = pd.DataFrame(steps, columns=self.step_features)
+            for c in self.static_features:
+                df[c] = static.get(c)
+            return self.predict(df)
+        X = np.empty((steps.shape[0], len(self.feature_cols)), dtype=np.float64)
+        X[:, self._static_idx] = static_vec
+        X[:, self._step_idx] = self.transform_num_array(self.step_features, steps)
+        return self._point(self.model.predict(X))
+
+    def representative_frame(self, n_rows: int = 32) -> pd.DataFrame:
+        """
+        预热用的代表性样本：有 drift_reference 时按训练分布的分位点取值（覆盖各分位），
+        否则取 imputer 的填充值（训练中位数）；类别列取 'NA'。
+        """
+        ref = (self.drift_reference or {}).get('features', {})
+        fill = self._num_affine[0] if self._num_affine is not None else np.full(len(self.num_features), np.nan)
+        q = np.linspace(0, 1, max(n_rows, 1))
+        data = {}
+        for i, c in enumerate(self.num_features):
+            edges = ref.get(c, {}).get('edges')
+            if edges:
+                data[c] = np.asarray(edges, dtype=np.float64)[np.round(q * (len(edges) - 1)).astype(int)]
+            else:
+                data[c] = np.full(len(q), 0.0 if np.isnan(fill[i]) else fill[i])
+        for c in self.cat_features:
+            data[c] = ['NA'] * len(q)
+        return pd.DataFrame(data, columns=self.feature_cols)
+
+    def warm_up(self, n_rows: int = 32):
+        """用代表性样本走一遍单条、批量与按工步预测路径，避免首个请求承担冷启动开销"""
+        df = self.representative_frame(n_rows)
+        self.predict(df.iloc[:1])
+        self.predict(df)
+        if self.static_features and self.step_features:
+            static = df.iloc[0][self.static_features].to_dict()
+            self.predict_trajectory(static, df[self.step_features].to_numpy(dtype=np.float64))
 
 
 
 _model_service = None
+_model_service_lock = threading.Lock()
 
 
 def get_model_service():
     global _model_service
     if _model_service is None:
-        _model_service = ModelService()
+        with _model_service_lock:
+            if _model_service is None:
+                _model_service = ModelService()
+    return _model_service
+
+
+def loaded_model_service():
+    """已加载的主模型服务；尚未加载时返回 None（不会触发加载，供健康检查使用）"""
     return _model_service
\ No newline at end of file
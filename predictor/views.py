@@ -1,5 +1,4 @@
 # predictor/views.py
-import io
 import csv
 import os
 import time
@@ -7,16 +6,30 @@ import uuid
 import logging
 from typing import List
 
+import numpy as np
 import pandas as pd
 from django.conf import settings
-from django.http import HttpResponse
+from django.http import FileResponse, HttpResponse
+from django.urls import reverse
+from rest_framework.permissions import IsAdminUser
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from .models import PredictionRecord
 from logger.models import LogRecord
-from .utils import get_model_service
-from .serializers import SinglePredictSerializer, BatchPredictSerializer
+from .utils import get_model_service, loaded_model_service
+from .health import get_readiness
+from .feature_store import get_feature_store
+from .shadow import get_shadow
+from .drift import get_drift_monitor
+from .admission import AdmissionControlledView, get_admission
+from .idempotency import IdempotentPostMixin
+from .profiling import ProfilingMixin, get_profiler
+from .results import prediction_dir, result_path, serve_result, maybe_reap
+from .result_cache import get_result_cache, row_keys
+from .bulk_io import FILE_FORMATS, COLUMNAR_FORMATS, detect_format, read_frame, write_part
+from .serializers import (SinglePredictSerializer, BatchPredictSerializer, TrajectoryPredictSerializer,
+                          CellFeatureUpsertSerializer)
 
 logger = logging.getLogger(__name__)
 
@@ -26,27 +39,26 @@ def _make_download_path(filename: str) -> str:
     返回结果文件保存路径（绝对），并确保目录存在。
     保存到 settings.MEDIA_ROOT/predictions/
     """
-    media_root = getattr(settings, "MEDIA_ROOT", None)
-    if not media_root:
-        # fallback to project root /media
-        media_root = os.path.join(settings.BASE_DIR, "media")
-    out_dir = os.path.join(media_root, "predictions")
-    os.makedirs(out_dir, exist_ok=True)
-    return os.path.join(out_dir, filename)
+    return os.path.join(prediction_dir(), filename)
 
 
 def _build_download_url(request, filepath: str) -> str:
     """
-    根据 request 构建可被浏览器下载的绝对 URL（假设 MEDIA_URL 可直接访问，或者 nginx 配置了 media 路径）
-    如果 MEDIA_URL 是默认 '/media/'，并且 nginx 正确映射 MEDIA_ROOT，则该 URL 可下载文件。
+    根据 request 构建可被浏览器下载的绝对 URL（由 PredictFileDownload 提供下载）
     """
-    media_url = getattr(settings, "MEDIA_URL", "/media/")
-    # filename relative to media root
     filename = os.path.basename(filepath)
-    # build absolute uri
-    base = request.build_absolute_uri('/')
-    # ensure no double slashes
-    return request.build_absolute_uri(os.path.join(media_url.lstrip('/'), 'predictions', filename))
+    return request.build_absolute_uri(reverse('predictor:predict_file_download', args=[filename]))
+
+
+def _observe_drift(method: str, *args):
+    """更新漂移监控；监控关闭时跳过，出错只记日志，不影响预测结果"""
+    monitor = get_drift_monitor()
+    if monitor is None:
+        return
+    try:
+        getattr(monitor, method)(*args)
+    except Exception:
+        logger.exception("Drift monitor update failed")
 
 
 # --- Views ----------------------------------------------------------------
@@ -54,33 +66,68 @@ class HealthCheck(APIView):
     """
     简单健康检查接口。返回 ok + model_version（如果加载成功）。
     GET /api/health/
+    模型尚未加载时不在请求线程里加载（交给后台线程），避免探针超时。
     """
     permission_classes = []  # 如果需要鉴权，在这里添加
 
     def get(self, request):
         info = {"status": "ok"}
-        try:
-            svc = get_model_service()
-            # metadata may include model_version
-            model_version = getattr(svc, "model_version", None)
-            # some metadata may be loaded from meta
+        readiness = get_readiness()
+        svc = loaded_model_service()
+        if svc is not None:
             info.update({
-                "model_version": model_version,
+                "model_version": getattr(svc, "model_version", None),
                 "feature_count": len(getattr(svc, "feature_cols", []))
             })
-        except Exception as e:
-            logger.exception("Health: model service not loaded")
-            info.update({"model_load_error": str(e)})
+        else:
+            readiness.ensure_loading()
+            info["model_loaded"] = False
+            if readiness.model_error:
+                info["model_load_error"] = readiness.model_error
+        # 准入控制：各类别在途数、排队数、拒绝数
+        info["admission"] = get_admission().summary()
         return Response(info)
 
 
-class PredictSingle(APIView):
+class HealthLive(APIView):
+    """
+    存活探针：进程能处理请求即返回 200（常数时间，不访问模型和数据库）
+    GET /api/health/live/
+    """
+    permission_classes = []
+    authentication_classes = []
+
+    def get(self, request):
+        return Response({"status": "alive"})
+
+
+class HealthReady(APIView):
+    """
+    就绪探针：模型已加载并预热、数据库可写、准入队列无积压时返回 200，否则 503
+    GET /api/health/ready/
+    """
+    permission_classes = []
+    authentication_classes = []
+
+    def get(self, request):
+        ready, detail = get_readiness().status()
+        detail["status"] = "ready" if ready else "not_ready"
+        return Response(detail, status=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+class PredictSingle(IdempotentPostMixin, ProfilingMixin, AdmissionControlledView):
     """
     单条预测接口（同步，低延迟场景）
     POST /api/predict/
-    body: {"data": {"feature1": val1, "feature2": val2, ...}}
+    body: {"data": {"feature1": val1, "feature2": val2, ...}, "uncertainty": false}
+    - uncertainty=true 时返回 uncertainty，形式取决于模型训练时的损失函数：
+      MultiQuantile：{"type": "quantile", "lower", "upper", "alpha"}（预测区间）；
+      RMSEWithUncertainty：{"type": "total", "std", "data_std", "model_std"}；
+      RMSE：{"type": "epistemic", "model_std"}（虚拟集成估计的模型不确定性，不是带置信水平的预测区间）
+    可带 Idempotency-Key 请求头：重试时直接返回首次响应，不重复推理和写库
     """
     permission_classes = []
+    admission_class = 'single'
 
     def post(self, request):
         t0 = time.time()
@@ -101,11 +148,36 @@ class PredictSingle(APIView):
 
         # validated data: cleaned dict (按 feature_cols 顺序)
         cleaned = serializer.validated_data['data']
+        static_vec = serializer.validated_data.get('static_vec')
 
         try:
-            svc = get_model_service()
-            df = pd.DataFrame([cleaned], columns=svc.feature_cols)  # 保证列顺序
-            preds = svc.predict(df)
+            shadow = get_shadow()
+            svc, is_canary = shadow.choose_service()
+            # 结果缓存（与 /api/explain/ 共用 key）：相同特征向量直接返回
+            cache = get_result_cache()
+            keys = row_keys(svc, [cleaned])
+            hit = cache.get_many(keys)[0]
+            with_uncertainty = serializer.validated_data.get('uncertainty')
+            uncertainty = None
+            if with_uncertainty:
+                # 不确定性总要调用一次模型：与预测共用一次预处理，缓存命中也不省
+                preds, unc = svc.predict_with_uncertainty(pd.DataFrame([cleaned], columns=svc.feature_cols))
+                uncertainty = {"type": unc["type"], **{k: float(v[0]) for k, v in unc["values"].items()}}
+                if "alpha" in unc:
+                    uncertainty["alpha"] = unc["alpha"]
+            elif hit is not None:
+                preds = np.array([hit["prediction"]])
+            elif static_vec is not None and not is_canary:
+                # 来料特征来自特征库（已预处理），只需处理工步特征
+                preds = svc.predict_trajectory(cleaned, [[cleaned[c] for c in svc.step_features]], static_vec=static_vec)
+            else:
+                df = pd.DataFrame([cleaned], columns=svc.feature_cols)  # 保证列顺序
+                preds = svc.predict(df)
+            if hit is None:
+                cache.put_many(keys, preds)
+            if not is_canary:
+                shadow.maybe_submit([cleaned], preds)
+            _observe_drift('observe_records', [cleaned], None if is_canary else preds)
             elapsed = time.time() - t0
             prediction_value = float(preds[0])
 
@@ -124,8 +196,11 @@ class PredictSingle(APIView):
             resp = {
                 "prediction": prediction_value,
                 "model_version": getattr(svc, "model_version", None),
+                "canary": is_canary,
                 "elapsed_seconds": round(elapsed, 4)
             }
+            if uncertainty is not None:
+                resp["uncertainty"] = uncertainty
             logger.info("SinglePredict success, elapsed=%.3fs", elapsed)
             return Response(resp)
         except Exception as e:
@@ -140,15 +215,23 @@ class PredictSingle(APIView):
             )
 
 
-class PredictBatch(APIView):
+class PredictBatch(IdempotentPostMixin, ProfilingMixin, AdmissionControlledView):
     """
     批量预测接口（接收 list of dict）
     POST /api/predict/batch/
-    body: {"data": [ {feature dict}, {feature dict}, ... ]}
+    body: {"data": [ {feature dict}, {feature dict}, ... ], "uncertainty": false}
+    - uncertainty=true 时每条结果增加 prediction_<名称> 列（如 prediction_lower / prediction_upper，
+      RMSE 模型只有 prediction_model_std，不是预测区间），名称见 /api/predict/；响应中 uncertainty_type 标明类型
+    - 与 /api/predict/、/api/explain/ 共用结果缓存，只对未命中的行推理（uncertainty=true 时整批计算，不查缓存）
+    可带 Idempotency-Key 请求头（同 /api/predict/）
     返回：{"predictions": [ {原输入..., "prediction": x}, ... ], "model_version": ...}
     注意：当数据量非常大时，建议使用文件上传 + 后台任务（Celery）。
     """
     permission_classes = []
+    admission_class = 'batch'
+
+    # 按 Content-Length 估算行数：被拒绝的大请求不必先解析整个 JSON
+    admission_payload = 'json'
 
     def post(self, request):
         t0 = time.time()
@@ -162,12 +245,24 @@ class PredictBatch(APIView):
         records: List[dict] = serializer.validated_data['data']
 
         try:
-            svc = get_model_service()
+            shadow = get_shadow()
+            svc, is_canary = shadow.choose_service()
             # DataFrame, 确保列顺序一致
             df = pd.DataFrame(records, columns=svc.feature_cols)
-            preds = svc.predict(df)  # numpy array
+            with_uncertainty = serializer.validated_data.get('uncertainty')
+            unc = None
+            if with_uncertainty:
+                preds, unc = svc.predict_with_uncertainty(df)
+            else:
+                preds = svc.predict(df, cache=get_result_cache())  # numpy array
+            if not is_canary:
+                shadow.maybe_submit(records, preds)
+            _observe_drift('observe_frame', df, None if is_canary else preds)
             df_result = df.copy()
             df_result['prediction'] = preds
+            if unc is not None:
+                for name, values in unc["values"].items():
+                    df_result[f'prediction_{name}'] = values
             elapsed = time.time() - t0
             # 将结果转为 records（谨慎：如果数据量大，不要把全部放到内存返回）
             results = df_result.to_dict(orient='records')
@@ -175,8 +270,11 @@ class PredictBatch(APIView):
                 "predictions": results,
                 "count": len(results),
                 "model_version": getattr(svc, "model_version", None),
+                "canary": is_canary,
                 "elapsed_seconds": round(elapsed, 4)
             }
+            if unc is not None:
+                resp["uncertainty_type"] = unc["type"]
             logger.info("BatchPredict success, count=%d, elapsed=%.3fs", len(results), elapsed)
             return Response(resp)
         except Exception as e:
@@ -184,16 +282,203 @@ class PredictBatch(APIView):
             return Response({"error": "predict_failed", "detail": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class PredictFile(APIView):
+class PredictTrajectory(AdmissionControlledView):
+    """
+    单个电芯多工步（轨迹）预测接口
+    POST /api/predict/trajectory/
+    body: {"cell_id": "...", "static": {来料特征...}, "step_columns": [...可选...], "steps": [[...], [...]]}
+    - 来料特征每个电芯只传一次，只预处理一次，再广播到每个工步
+    返回：{"cell_id": ..., "predictions": [v1, v2, ...], "count": n, "model_version": ...}
+    """
+    permission_classes = []
+    admission_class = 'batch'
+    admission_payload = 'step'
+
+    def post(self, request):
+        t0 = time.time()
+        serializer = TrajectoryPredictSerializer(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except Exception:
+            logger.debug("TrajectoryPredict: validation failed: %s", serializer.errors)
+            return Response({"error": "validation_error", "detail": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+        try:
+            svc = get_model_service()
+            preds = svc.predict_trajectory(data['static'], data['steps'], static_vec=data.get('static_vec'))
+            _observe_drift('observe_trajectory', data['static'], data['steps'], svc.step_features, preds)
+            elapsed = time.time() - t0
+            resp = {
+                "cell_id": data.get('cell_id'),
+                "predictions": preds.tolist(),
+                "count": len(preds),
+                "model_version": getattr(svc, "model_version", None),
+                "elapsed_seconds": round(elapsed, 4)
+            }
+            logger.info("TrajectoryPredict success, count=%d, elapsed=%.3fs", len(preds), elapsed)
+            return Response(resp)
+        except Exception as e:
+            logger.exception("TrajectoryPredict: predict failed")
+            return Response({"error": "predict_failed", "detail": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class ShadowReport(APIView):
+    """
+    候选模型影子评估 / 金丝雀分流统计
+    GET /api/shadow/?recent=100
+    返回候选模型与主模型预测差值的流式统计、请求线程上的提交耗时，以及最近 recent 条预测对
+    """
+    permission_classes = []
+
+    def get(self, request):
+        try:
+            recent = int(request.query_params.get('recent', 0))
+        except ValueError:
+            return Response({"error": "invalid_recent"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(get_shadow().summary(recent=max(0, recent)))
+
+
+class Explain(AdmissionControlledView):
+    """
+    预测解释接口（SHAP）
+    POST /api/explain/
+    body: {"data": {feature dict} 或 [ {feature dict}, ... ], "top_k": 5}
+    - 整批一次计算 SHAP，结果与 /api/predict/ 共用缓存 key，重复的特征向量不再计算
+    - top_k：只返回绝对贡献最大的 k 个特征（缺省返回全部特征）
+    返回：{"explanations": [{"prediction": x, "contributions": [{"feature": f, "value": v, "shap": s}, ...]}],
+          "expected_value": ..., "model_version": ...}
+    """
+    permission_classes = []
+    admission_class = 'batch'
+
+    # 按 Content-Length 估算行数：被拒绝的大请求不必先解析整个 JSON
+    admission_payload = 'json'
+
+    def post(self, request):
+        t0 = time.time()
+        payload = request.data.get('data') if hasattr(request.data, 'get') else None
+        if isinstance(payload, dict):
+            payload = [payload]
+        serializer = BatchPredictSerializer(data={"data": payload})
+        if not serializer.is_valid():
+            return Response({"error": "validation_error", "detail": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            top_k = request.data.get('top_k')
+            top_k = int(top_k) if top_k is not None else None
+        except (TypeError, ValueError):
+            return Response({"error": "invalid_top_k"}, status=status.HTTP_400_BAD_REQUEST)
+
+        records = serializer.validated_data['data']
+        try:
+            svc = get_model_service()
+            df = pd.DataFrame(records, columns=svc.feature_cols)
+            preds, shap, expected = svc.explain(df, cache=get_result_cache())
+        except Exception as e:
+            logger.exception("Explain: explain failed")
+            return Response({"error": "explain_failed", "detail": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        k = len(svc.feature_cols) if not top_k or top_k <= 0 else min(top_k, len(svc.feature_cols))
+        # 每行按 |SHAP| 从大到小取前 k 个特征（整批向量化排序）
+        order = np.argsort(-np.abs(shap), axis=1)[:, :k]
+        values = df.to_numpy()
+        cols = svc.feature_cols
+        explanations = []
+        for i in range(len(df)):
+            explanations.append({
+                "prediction": float(preds[i]),
+                "contributions": [{"feature": cols[j], "value": values[i, j], "shap": float(shap[i, j])}
+                                  for j in order[i]],
+            })
+        elapsed = time.time() - t0
+        logger.info("Explain success, count=%d, elapsed=%.3fs", len(explanations), elapsed)
+        return Response({
+            "explanations": explanations,
+            "count": len(explanations),
+            "expected_value": expected,
+            "model_version": getattr(svc, "model_version", None),
+            "elapsed_seconds": round(elapsed, 4)
+        })
+
+
+class DriftReport(APIView):
+    """
+    在线漂移监控
+    GET /api/drift/?histograms=1   各数值特征与预测值的均值/方差、PSI（可选返回分箱计数）
+    DELETE /api/drift/             清空统计，重新开始一个观察窗口
+    """
+    permission_classes = []
+
+    def get(self, request):
+        monitor = get_drift_monitor()
+        if monitor is None:
+            return Response({"error": "drift_monitor_disabled"}, status=status.HTTP_404_NOT_FOUND)
+        histograms = request.query_params.get('histograms') in ('1', 'true')
+        return Response(monitor.summary(histograms=histograms))
+
+    def delete(self, request):
+        monitor = get_drift_monitor()
+        if monitor is None:
+            return Response({"error": "drift_monitor_disabled"}, status=status.HTTP_404_NOT_FOUND)
+        monitor.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class CellFeatureUpsert(APIView):
+    """
+    电芯来料特征批量写入/更新
+    POST /api/features/cells/
+    body: {"cells": [{"cell_id": "...", "features": {"来料...": v, ...}}, ...]}
+    """
+    permission_classes = []
+
+    def post(self, request):
+        serializer = CellFeatureUpsertSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({"error": "validation_error", "detail": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            count = get_feature_store().upsert(serializer.validated_data['cells'])
+        except Exception as e:
+            logger.exception("CellFeatureUpsert: upsert failed")
+            return Response({"error": "upsert_failed", "detail": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        logger.info("CellFeatureUpsert success, count=%d", count)
+        return Response({"count": count})
+
+
+class CellFeatureDetail(APIView):
+    """
+    按电芯条码查询来料特征
+    GET /api/features/cells/<cell_id>/
+    """
+    permission_classes = []
+
+    def get(self, request, cell_id):
+        entry = get_feature_store().get(cell_id)
+        if entry is None:
+            return Response({"error": "not_found", "cell_id": cell_id}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"cell_id": cell_id, "features": entry.features})
+
+
+class PredictFile(ProfilingMixin, AdmissionControlledView):
     """
     文件上传批量预测接口（同步处理小/中等文件）
     POST /api/predict/file/
-    FormData: file=<csv file>
-    - CSV 必须包含模型的 feature 列名（可以有额外列）
-    - 返回：成功时生成 CSV 文件链接（保存于 MEDIA_ROOT/predictions/）
+    FormData: file=<文件>, columns=<可选，原样带到结果的列，逗号分隔>, output_format=<可选>
+    - 支持 CSV、gzip/zstd 压缩 CSV、Parquet、Feather，按文件头自动识别
+    - 文件必须包含模型的 feature 列名（可以有额外列）
+    - Parquet/Feather 只读取 feature 列 + columns 指定的列；CSV 未指定 columns 时保留全部原始列
+    - output_format: csv / csv.gz / csv.zst / parquet / feather，缺省与输入格式相同
+      （输入为普通 CSV 且 PREDICTION_GZIP_OUTPUT 开启时默认输出 csv.gz）
+    - uncertainty=1：结果增加不确定性列（同 /api/predict/batch/，RMSE 模型只有 prediction_model_std）
+    - 返回：成功时生成结果文件链接（保存于 MEDIA_ROOT/predictions/，经 PredictFileDownload 下载）
     注意：若文件很大或需并发处理，请改成异步任务队列（Celery）。
     """
     permission_classes = []
+    admission_class = 'file'
+    profile_memory = True
+
+    # 尚未解析上传内容，按 Content-Length 估算行数
+    admission_payload = 'file'
 
     def post(self, request):
         # 简单 auth key（可选）
@@ -213,19 +498,30 @@ class PredictFile(APIView):
             logger.exception("PredictFile: model service not available")
             return Response({"error": "model_not_loaded", "detail": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        # 读取 CSV 到 DataFrame（注意 encoding / separator，可根据实际定制）
+        # 先把上传文件读到内存 bytes，按文件头识别格式
+        content = file_obj.read()
+        in_format = detect_format(content[:8])
+        out_format = request.data.get('output_format') or in_format
+        if out_format == 'csv' and not request.data.get('output_format') and settings.PREDICTION_GZIP_OUTPUT:
+            out_format = 'csv.gz'
+        if out_format not in FILE_FORMATS:
+            return Response({"error": "invalid_output_format", "supported": list(FILE_FORMATS)},
+                            status=status.HTTP_400_BAD_REQUEST)
+        with_uncertainty = str(request.data.get('uncertainty', '')).lower() in ('1', 'true')
+        passthrough = [c for c in (request.data.get('columns') or '').split(',') if c]
+        if passthrough:
+            columns = list(dict.fromkeys(svc.feature_cols + passthrough))
+        elif in_format in COLUMNAR_FORMATS:
+            columns = svc.feature_cols
+        else:
+            columns = None  # CSV 保持原行为：保留全部原始列
+
         try:
-            # 先把上传文件读到内存 bytes，然后 pandas 读取（更通用，避免 tempfile）
-            content = file_obj.read()
-            # 尝试 UTF-8, 若失败可尝试 GBK 等（可按需扩展）
-            try:
-                df_in = pd.read_csv(io.BytesIO(content))
-            except Exception:
-                # second attempt with gbk
-                df_in = pd.read_csv(io.BytesIO(content), encoding='gbk')
+            df_in = read_frame(content, in_format, columns)
         except Exception as e:
-            logger.exception("PredictFile: failed to read csv")
-            return Response({"error": "read_csv_failed", "detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            logger.exception("PredictFile: failed to read %s", in_format)
+            return Response({"error": "read_file_failed", "format": in_format, "detail": str(e)},
+                            status=status.HTTP_400_BAD_REQUEST)
 
         # 检查是否包含必须的 feature 列
         missing = [c for c in svc.feature_cols if c not in df_in.columns]
@@ -244,26 +540,38 @@ class PredictFile(APIView):
             for start in range(0, total, chunk_size):
                 end = min(total, start + chunk_size)
                 df_chunk = df_need.iloc[start:end]
-                preds = svc.predict(df_chunk)
+                unc = None
+                if with_uncertainty:
+                    preds, unc = svc.predict_with_uncertainty(df_chunk)
+                else:
+                    preds = svc.predict(df_chunk)
+                _observe_drift('observe_frame', df_chunk, preds)
                 df_chunk_result = df_in.iloc[start:end].copy()  # 保持原始列（包含额外列）
                 df_chunk_result['prediction'] = preds
+                if unc is not None:
+                    for name, values in unc["values"].items():
+                        df_chunk_result[f'prediction_{name}'] = values
                 out_rows.append(df_chunk_result)
             df_out = pd.concat(out_rows, axis=0)
         except Exception as e:
             logger.exception("PredictFile: batch predict failed")
             return Response({"error": "predict_failed", "detail": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        # 保存结果为 csv
-        filename = f"pred_{uuid.uuid4().hex}.csv"
+        # 保存结果文件
+        filename = f"pred_{uuid.uuid4().hex}{FILE_FORMATS[out_format]}"
         out_path = _make_download_path(filename)
         try:
-            df_out.to_csv(out_path, index=False, encoding='utf-8-sig')
+            # 先写临时文件再 os.replace：并发的下载 / 清理不会看到半写的文件
+            write_part(df_out, out_path, out_format)
+            maybe_reap(keep=out_path)
             download_url = _build_download_url(request, out_path)
             elapsed = time.time() - start_time
             logger.info("PredictFile success: saved %s, rows=%d, elapsed=%.2fs", filename, len(df_out), elapsed)
             return Response({
                 "file_name": filename,
                 "rows": len(df_out),
+                "input_format": in_format,
+                "output_format": out_format,
                 "download_url": download_url,
                 "model_version": getattr(svc, "model_version", None),
                 "elapsed_seconds": round(elapsed, 3)
@@ -271,3 +579,65 @@ class PredictFile(APIView):
         except Exception as e:
             logger.exception("PredictFile: save failed")
             return Response({"error": "save_failed", "detail": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class PredictFileDownload(APIView):
+    """
+    文件预测结果下载
+    GET /api/predict/file/<file_name>/
+    - 支持 Range（断点续传）、ETag / If-None-Match
+    - 过期文件会被定期清理，返回 404
+    """
+    permission_classes = []
+
+    def get(self, request, file_name):
+        path = result_path(file_name)
+        if path is None or not os.path.exists(path):
+            return Response({"error": "not_found", "file_name": file_name}, status=status.HTTP_404_NOT_FOUND)
+        return serve_result(request, path)
+
+
+class ProfilingAdmin(APIView):
+    """
+    性能剖析开关（仅管理员）
+    GET /api/admin/profiling/      当前配置、各视图采样次数、文件预测的内存峰值
+    POST /api/admin/profiling/     {"enabled": true, "mode": "stack"|"cprofile", "sample_rate": 0.05, "interval_ms": 5}
+    DELETE /api/admin/profiling/   清空已汇总的剖析数据
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_profiler().summary())
+
+    def post(self, request):
+        data = request.data
+        try:
+            get_profiler().configure(enabled=data.get('enabled'), mode=data.get('mode'),
+                                     sample_rate=data.get('sample_rate'), interval_ms=data.get('interval_ms'))
+        except (TypeError, ValueError) as e:
+            return Response({"error": "validation_error", "detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(get_profiler().summary())
+
+    def delete(self, request):
+        get_profiler().reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ProfilingOutput(APIView):
+    """
+    下载某个视图的最新剖析结果（仅管理员）
+    GET /api/admin/profiling/<view_name>/
+    - stack 模式：collapsed stacks 文本（flamegraph.pl / speedscope）
+    - cprofile 模式：pstats 二进制（snakeviz）
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, view_name):
+        if not view_name.replace('.', '').replace('_', '').isalnum():
+            return Response({"error": "not_found", "view": view_name}, status=status.HTTP_404_NOT_FOUND)
+        path = get_profiler().latest_path(view_name)
+        if path is None:
+            return Response({"error": "not_found", "view": view_name}, status=status.HTTP_404_NOT_FOUND)
+        if path.endswith('.collapsed'):
+            return FileResponse(open(path, 'rb'), content_type='text/plain; charset=utf-8')
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=os.path.basename(path))
@@ -1,70 +1,277 @@
+"""
+训练并发布模型：
+    python train_and_save.py <pack 文件或目录> [...] --version v2
+
+- 支持多个 pack 文件（CSV/Parquet，目录会展开），只读取需要的列，数值列按 float32 读取
+- 解析后的数据集缓存为 Parquet/Feather（按输入文件路径、大小、修改时间做 key），重跑直接读缓存
+- 训练集构造成 CatBoost Pool 并量化，量化后的 Pool 也会缓存，参数不变时重跑跳过量化
+- 产物先写入临时目录，再原子 rename 为 models/versions/<version>/，最后原子更新 models/CURRENT
+  （ModelService 通过 CURRENT 找到当前版本，训练过程中不会读到半写的文件）
+- metadata.json 中写入训练分布的分位数参考直方图（drift_reference），供线上漂移监控使用
+- --loss 选择损失函数并写入 metadata.json（loss / quantiles），决定线上 uncertainty=true 的返回形式：
+  RMSE（默认，只有虚拟集成的模型不确定性）、RMSEWithUncertainty（数据 + 模型不确定性）、
+  MultiQuantile:alpha=0.05,0.5,0.95（预测区间，alpha 须包含 0.5 作为点预测）
+- 结束时输出各阶段耗时与峰值 RSS
+"""
+import argparse
+import hashlib
 import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import joblib
 import numpy as np
 import pandas as pd
-from catboost import CatBoostRegressor
+from catboost import CatBoostRegressor, Pool
 from sklearn.pipeline import Pipeline
 from sklearn.impute import SimpleImputer
 from sklearn.preprocessing import StandardScaler
 
+from predictor.bulk_io import iter_input_files, read_frame, write_frame
+from predictor.stats import reference_histogram
+
 
 MODELS_DIR = './models'
+CELL_COL = '电芯条码'
+TARGET_COL = '单体电压'
+EXCLUDE_COLS = [CELL_COL, TARGET_COL, '电芯实际位置', '累计时间', '时间', '电芯OCV4时间']
+LOSSES = ('RMSE', 'RMSEWithUncertainty', 'MultiQuantile')
 
 
-if __name__ == '__main__':
-    df = pd.read_csv('C:/Users/HP/PycharmProjects/Capacity_Prediction/dataset/pack_data/03HPB0BT0001EYF7S0000035.csv')
+def peak_rss_mb():
+    """当前进程峰值 RSS（MB），平台不支持时返回 None"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return rss / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10)
+
 
+def infer_schema(path, cat_features=None):
+    """读表头和少量样本，确定特征列与类别列（不读全量数据）"""
+    if path.lower().endswith(('.parquet', '.pq')):
+        import pyarrow.parquet as pq
+        sample = pq.ParquetFile(path).read_row_group(0).to_pandas().head(1000)
+    else:
+        sample = pd.read_csv(path, nrows=1000)
+    feature_cols = [c for c in sample.columns if c not in EXCLUDE_COLS]
+    if cat_features is None:
+        cat_features = [c for c in feature_cols if sample[c].dtype == 'object']
+    num_features = [c for c in feature_cols if c not in cat_features]
+    return feature_cols, cat_features, num_features
 
-    feature_cols = [col for col in df.columns
-    if col not in ['电芯条码', '单体电压', '电芯实际位置', '累计时间', '时间', '电芯OCV4时间']]
 
+def read_pack(path, columns, dtypes):
+    """读取单个 pack 文件，只读 columns，数值列直接按 float32 解析"""
+    if path.lower().endswith(('.parquet', '.pq')):
+        with open(path, 'rb') as f:
+            df = read_frame(f.read(), 'parquet', columns)
+        return df.astype(dtypes)
+    return pd.read_csv(path, usecols=columns, dtype=dtypes)
+
+
+def load_dataset(files, columns, dtypes, cache_dir, cache_format, workers):
+    """多文件并行读取并缓存；缓存 key 由文件路径/大小/修改时间与列定义决定"""
+    h = hashlib.sha1()
+    for p in files:
+        st = os.stat(p)
+        h.update(f'{os.path.abspath(p)}|{st.st_size}|{st.st_mtime_ns}\n'.encode('utf-8'))
+    h.update(json.dumps([columns, {k: str(v) for k, v in dtypes.items()}], ensure_ascii=False).encode('utf-8'))
+    key = h.hexdigest()[:16]
+    cache_path = None
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        cache_path = os.path.join(cache_dir, f'dataset_{key}.{cache_format}')
+        if os.path.exists(cache_path):
+            print(f'读取数据集缓存 {cache_path}')
+            df = pd.read_parquet(cache_path) if cache_format == 'parquet' else pd.read_feather(cache_path)
+            return df, key
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        frames = list(pool.map(lambda p: read_pack(p, columns, dtypes), files))
+    df = pd.concat(frames, axis=0, ignore_index=True)
+    del frames
+    df[CELL_COL] = df[CELL_COL].astype('category')
+    if cache_path:
+        tmp = f'{cache_path}.tmp'
+        write_frame(df, tmp, cache_format)
+        os.replace(tmp, cache_path)
+        print(f'数据集已缓存到 {cache_path}')
+    return df, key
 
-    cat_features = [c for c in feature_cols if df[c].dtype == 'object']
-    num_features = [c for c in feature_cols if c not in cat_features]
 
+def publish(models_dir, version, model, num_pipeline, meta, activate=True):
+    """写入临时目录后原子 rename 为 versions/<version>，再原子更新 CURRENT"""
+    versions_dir = os.path.join(models_dir, 'versions')
+    os.makedirs(versions_dir, exist_ok=True)
+    final_dir = os.path.join(versions_dir, version)
+    if os.path.exists(final_dir):
+        raise SystemExit(f'模型版本已存在：{final_dir}')
+    tmp_dir = os.path.join(versions_dir, f'.tmp-{version}-{os.getpid()}')
+    os.makedirs(tmp_dir)
+    try:
+        model.save_model(os.path.join(tmp_dir, 'catboost_model.cbm'))
+        joblib.dump(num_pipeline, os.path.join(tmp_dir, 'num_pipeline.joblib'))
+        with open(os.path.join(tmp_dir, 'metadata.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.rename(tmp_dir, final_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    if activate:
+        current_tmp = os.path.join(models_dir, f'.CURRENT.{os.getpid()}')
+        with open(current_tmp, 'w', encoding='utf-8') as f:
+            f.write(version)
+        os.replace(current_tmp, os.path.join(models_dir, 'CURRENT'))
+    return final_dir
 
-    unique_cells = df['电芯条码'].unique()
-    np.random.seed(42)
-    train_cells = np.random.choice(unique_cells, size=min(100, len(unique_cells)), replace=False)
 
+def parse_loss(loss):
+    """解析 --loss，返回 (CatBoost loss_function, 分位数列表或 None)；MultiQuantile 的 alpha 排序后写回"""
+    name, _, params = loss.partition(':')
+    if name not in LOSSES:
+        raise SystemExit(f'--loss 只支持 {", ".join(LOSSES)}')
+    if name != 'MultiQuantile':
+        return loss, None
+    if not params.startswith('alpha='):
+        raise SystemExit('MultiQuantile 需要指定分位数，如 MultiQuantile:alpha=0.05,0.5,0.95')
+    alphas = sorted({float(a) for a in params[len('alpha='):].split(',') if a})
+    if 0.5 not in alphas or not all(0 < a < 1 for a in alphas):
+        raise SystemExit('MultiQuantile 的 alpha 须在 (0, 1) 内且包含 0.5（作为点预测）')
+    return f"MultiQuantile:alpha={','.join(str(a) for a in alphas)}", alphas
 
-    train_df = df[df['电芯条码'].isin(train_cells)].copy()
-    X_train = train_df[feature_cols]
-    y_train = train_df['单体电压']
 
+def parse_args():
+    parser = argparse.ArgumentParser(description='训练 CatBoost 模型并发布到 models/versions/<version>/')
+    parser.add_argument('inputs', nargs='+', help='pack 文件或目录（CSV/Parquet）')
+    parser.add_argument('--models-dir', default=MODELS_DIR)
+    parser.add_argument('--version', default=time.strftime('v%Y%m%d%H%M%S'))
+    parser.add_argument('--cache-dir', default='./dataset_cache', help='数据集缓存目录，传空字符串禁用')
+    parser.add_argument('--cache-format', choices=['parquet', 'feather'], default='parquet')
+    parser.add_argument('--cat-features', default=None, help='类别列，逗号分隔；缺省按样本 dtype 推断')
+    parser.add_argument('--train-cells', type=int, default=100, help='随机抽取的训练电芯数')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--learning-rate', type=float, default=0.05)
+    parser.add_argument('--depth', type=int, default=6)
+    parser.add_argument('--border-count', type=int, default=254)
+    parser.add_argument('--loss', default='RMSE',
+                        help='损失函数：RMSE / RMSEWithUncertainty / MultiQuantile:alpha=0.05,0.5,0.95')
+    parser.add_argument('--posterior-sampling', action='store_true',
+                        help='开启 posterior sampling，使虚拟集成的不确定性估计更可靠')
+    parser.add_argument('--drift-bins', type=int, default=10, help='漂移监控参考直方图的分箱数')
+    parser.add_argument('--thread-count', type=int, default=-1)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='并行读取文件的线程数')
+    parser.add_argument('--no-activate', action='store_true', help='只发布版本目录，不切换 CURRENT')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    loss_function, quantiles = parse_loss(args.loss)
+    t_start = time.time()
+    timings = {}
+
+    files = iter_input_files(args.inputs)
+    if not files:
+        raise SystemExit('没有找到输入文件')
+    cat_arg = None if args.cat_features is None else [c for c in args.cat_features.split(',') if c]
+    feature_cols, cat_features, num_features = infer_schema(files[0], cat_arg)
+    columns = [CELL_COL, TARGET_COL] + feature_cols
+    dtypes = {c: np.float32 for c in num_features + [TARGET_COL]}
+    dtypes.update({c: str for c in cat_features + [CELL_COL]})
+
+    t0 = time.time()
+    df, data_key = load_dataset(files, columns, dtypes, args.cache_dir, args.cache_format, args.workers)
+    timings['load'] = time.time() - t0
+    print(f'数据集：files={len(files)}, rows={len(df)}, mem={df.memory_usage(deep=True).sum() / 2 ** 20:.1f}MB')
+
+    unique_cells = df[CELL_COL].unique()
+    rng = np.random.RandomState(args.seed)
+    train_cells = rng.choice(np.asarray(unique_cells), size=min(args.train_cells, len(unique_cells)), replace=False)
+    # 只用布尔掩码取训练子集，不复制整个 DataFrame
+    mask = df[CELL_COL].isin(train_cells).to_numpy()
+    y_train = df[TARGET_COL].to_numpy()[mask]
 
     # 数值预处理 pipeline（示例）
+    t0 = time.time()
     num_pipeline = Pipeline([
-    ('imputer', SimpleImputer(strategy='median')),
-    ('scaler', StandardScaler())
+        ('imputer', SimpleImputer(strategy='median')),
+        ('scaler', StandardScaler())
     ])
+    drift_reference = {'features': {}}
     if num_features:
-        X_train[num_features] = num_pipeline.fit_transform(X_train[num_features])
+        raw_num = df.loc[mask, num_features]
+        # 训练集原始数值特征的分位数分箱，供线上漂移监控（predictor/drift.py）对齐
+        edges, expected = reference_histogram(raw_num.to_numpy(dtype=np.float32), args.drift_bins)
+        drift_reference['features'] = {c: {'edges': edges[i].tolist(), 'expected': expected[i].tolist()}
+                                       for i, c in enumerate(num_features)}
+        X_train = pd.DataFrame(num_pipeline.fit_transform(raw_num).astype(np.float32), columns=num_features)
+        del raw_num
+    else:
+        X_train = pd.DataFrame(index=range(int(mask.sum())))
+    for c in cat_features:
+        X_train[c] = df.loc[mask, c].fillna('NA').astype(str).to_numpy()
+    X_train = X_train[feature_cols]
+    del df
+    timings['preprocess'] = time.time() - t0
 
+    # 量化后的 Pool 缓存：数据、训练电芯与分箱参数不变时直接复用
+    t0 = time.time()
+    pool_path = None
+    if args.cache_dir:
+        pool_key = hashlib.sha1(
+            f'{data_key}|{args.seed}|{args.train_cells}|{args.border_count}|{cat_features}'.encode('utf-8')
+        ).hexdigest()[:16]
+        pool_path = os.path.join(args.cache_dir, f'pool_{pool_key}.quantized')
+    if pool_path and os.path.exists(pool_path):
+        print(f'读取量化 Pool 缓存 {pool_path}')
+        train_pool = Pool(data=f'quantized://{pool_path}')
+    else:
+        train_pool = Pool(X_train, label=y_train, cat_features=cat_features)
+        train_pool.quantize(border_count=args.border_count)
+        if pool_path:
+            train_pool.save(pool_path)
+    # 预测值漂移的参考分布：以训练集目标值分布近似
+    edges, expected = reference_histogram(y_train, args.drift_bins)
+    drift_reference['prediction'] = {'edges': edges[0].tolist(), 'expected': expected[0].tolist()}
+    del X_train
+    timings['quantize'] = time.time() - t0
 
-    model = CatBoostRegressor(iterations=500,
-                              learning_rate=0.05,
-                              depth=6,
-                              loss_function='RMSE',
+    t0 = time.time()
+    model = CatBoostRegressor(iterations=args.iterations,
+                              learning_rate=args.learning_rate,
+                              depth=args.depth,
+                              loss_function=loss_function,
+                              thread_count=args.thread_count,
+                              posterior_sampling=args.posterior_sampling,
                               verbose=100)
-    model.fit(X_train, y_train, cat_features=cat_features)
-
-
-    # 保存
-    model.save_model(f"{MODELS_DIR}/catboost_model.cbm")
-    joblib.dump(num_pipeline, f"{MODELS_DIR}/num_pipeline.joblib")
-
+    model.fit(train_pool)
+    timings['fit'] = time.time() - t0
 
     meta = {
-    'feature_cols': feature_cols,
-    'cat_features': cat_features,
-    'num_features': num_features,
-    'model_path': 'models/catboost_model.cbm',
-    'num_pipeline_path': 'models/num_pipeline.joblib',
-    'model_version': 'v1'
+        'feature_cols': feature_cols,
+        'cat_features': cat_features,
+        'num_features': num_features,
+        'static_features': [c for c in feature_cols if c.startswith('来料')],
+        'drift_reference': drift_reference,
+        'model_path': 'catboost_model.cbm',
+        'num_pipeline_path': 'num_pipeline.joblib',
+        'model_version': args.version,
+        'loss': loss_function,
+        'quantiles': quantiles,
+        'train_cells': [str(c) for c in train_cells],
+        'sources': [os.path.abspath(p) for p in files],
     }
-    with open(f"{MODELS_DIR}/metadata.json", 'w', encoding='utf-8') as f:
-        json.dump(meta, f, ensure_ascii=False, indent=2)
-
+    out_dir = publish(args.models_dir, args.version, model, num_pipeline, meta, activate=not args.no_activate)
 
-    print('模型与元数据已保存到 models/')
\ No newline at end of file
+    timings['total'] = time.time() - t_start
+    rss = peak_rss_mb()
+    print('耗时：' + ', '.join(f'{k}={v:.2f}s' for k, v in timings.items()))
+    print(f'峰值 RSS：{rss:.1f}MB' if rss is not None else '峰值 RSS：当前平台不支持')
+    print(f'模型与元数据已发布到 {out_dir}' + ('' if args.no_activate else '（已设为当前版本）'))
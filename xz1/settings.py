@@ -138,6 +138,22 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+# 文件预测结果保存在 MEDIA_ROOT/predictions/，经 /api/predict/file/<文件名>/ 下载
+MEDIA_ROOT = os.environ.get("MEDIA_ROOT", os.path.join(BASE_DIR, "media"))
+MEDIA_URL = "/media/"
+
+# 结果文件清理：超过保存时长或总大小超过磁盘预算时，从最旧的开始删除
+PREDICTION_MAX_AGE_HOURS = float(os.environ.get("PREDICTION_MAX_AGE_HOURS", 72))
+PREDICTION_MAX_DISK_MB = int(os.environ.get("PREDICTION_MAX_DISK_MB", 2048))
+PREDICTION_REAP_INTERVAL = float(os.environ.get("PREDICTION_REAP_INTERVAL", 300))
+# 新写出的结果在此时长内不会因磁盘预算被删除（客户端还没来得及下载）
+PREDICTION_REAP_GRACE_SECONDS = float(os.environ.get("PREDICTION_REAP_GRACE_SECONDS", 300))
+# 结果 CSV 默认 gzip 压缩写盘（请求显式指定 output_format 时不影响）
+PREDICTION_GZIP_OUTPUT = os.environ.get("PREDICTION_GZIP_OUTPUT", "1") == "1"
+# 由 nginx 发送文件时配置，如 X-Accel-Redirect + internal location 前缀
+PREDICTION_SENDFILE_HEADER = os.environ.get("PREDICTION_SENDFILE_HEADER") or None
+PREDICTION_SENDFILE_PREFIX = os.environ.get("PREDICTION_SENDFILE_PREFIX", "/protected/predictions/")
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 